@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+打字练习游戏 - 纯ANSI终端后端
+没有curses模块时（例如未安装windows-curses的Windows）终端版使用的替代实现。
+只实现终端版用到的那部分curses接口：窗口的addstr/getch/refresh等、颜色对、属性和按键常量。
+输出先写入缓冲区，每次refresh()只调用一次write；输入使用原始(cbreak)模式直接读取按键，
+不依赖任何第三方库，也没有任何导入时的副作用
+"""
+
+import os
+import select
+import shutil
+import sys
+import time
+import unicodedata
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import signal
+    import termios
+    import tty
+
+
+class error(Exception):
+    """与curses.error对应"""
+
+
+# 属性（取值与curses相同）
+A_NORMAL = 0
+A_UNDERLINE = 1 << 17
+A_BOLD = 1 << 21
+
+# 颜色
+COLOR_BLACK = 0
+COLOR_RED = 1
+COLOR_GREEN = 2
+COLOR_YELLOW = 3
+COLOR_BLUE = 4
+COLOR_MAGENTA = 5
+COLOR_CYAN = 6
+COLOR_WHITE = 7
+
+# 按键
+KEY_BACKSPACE = 263
+KEY_RESIZE = 410
+
+# 单独按下ESC与方向键等转义序列的区分时间（秒），与curses的ESCDELAY作用相同
+ESC_DELAY = 0.025
+
+_PAIR_SHIFT = 8
+_PAIR_MASK = 0xFF << _PAIR_SHIFT
+
+_pairs = {0: (None, None)}  # 颜色对编号 -> (前景色, 背景色)
+_sgr_cache = {}             # 属性 -> SGR转义序列
+_screen = None              # wrapper()创建的窗口
+
+
+def color_pair(n: int) -> int:
+    """颜色对对应的属性值"""
+    return n << _PAIR_SHIFT
+
+
+def start_color():
+    """ANSI终端总是支持颜色，这里无需初始化"""
+
+
+def init_pair(n: int, fg: int, bg: int):
+    """定义颜色对"""
+    _pairs[n] = (fg, bg)
+    _sgr_cache.clear()
+
+
+def curs_set(visibility: int):
+    """显示或隐藏光标"""
+    if _screen is not None:
+        _screen.write_now("\x1b[?25h" if visibility else "\x1b[?25l")
+
+
+def flushinp():
+    """丢弃尚未读取的输入"""
+    if _screen is not None:
+        _screen.flush_input()
+
+
+def _sgr(attr: int) -> str:
+    """属性对应的SGR转义序列（先重置再设置，结果按属性值缓存）"""
+    seq = _sgr_cache.get(attr)
+    if seq is None:
+        codes = ["0"]
+        if attr & A_BOLD:
+            codes.append("1")
+        if attr & A_UNDERLINE:
+            codes.append("4")
+        fg, bg = _pairs.get((attr & _PAIR_MASK) >> _PAIR_SHIFT, (None, None))
+        if fg is not None:
+            codes.append(str(30 + fg))
+        if bg is not None:
+            codes.append(str(40 + bg))
+        seq = _sgr_cache[attr] = "\x1b[" + ";".join(codes) + "m"
+    return seq
+
+
+def _clip(text: str, cells: int) -> str:
+    """截取不超过cells个终端单元格宽度的前缀"""
+    if len(text) * 2 <= cells:
+        return text
+    width = 0
+    for i, char in enumerate(text):
+        width += 2 if unicodedata.east_asian_width(char) in "WF" else 1
+        if width > cells:
+            return text[:i]
+    return text
+
+
+class AnsiWindow:
+    """
+    整个终端屏幕对应的窗口
+    addstr()等只把转义序列和文字追加到缓冲区，refresh()一次性写出
+    """
+
+    def __init__(self):
+        self._fd_out = sys.stdout.fileno()
+        self._fd_in = sys.stdin.fileno()
+        self._buffer = []
+        self._attr = A_NORMAL
+        self._delay = -1           # getch()等待的毫秒数，-1为一直等待
+        self._pending = bytearray()  # 已从终端读取但还没有返回的输入
+        self._size = self._query_size()
+        self._saved_tty = None
+        self._saved_winch = None
+        self._wake_r = self._wake_w = None
+
+    # ---------------------------------------------------------- 打开与关闭
+
+    def open(self):
+        """进入原始输入模式和备用屏幕"""
+        if sys.platform == "win32":
+            self._enable_vt_mode()
+        else:
+            self._saved_tty = termios.tcgetattr(self._fd_in)
+            tty.setcbreak(self._fd_in)
+            # 窗口大小变化时通过管道唤醒getch()中的select
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+            self._saved_winch = signal.signal(signal.SIGWINCH, self._on_winch)
+        self.write_now("\x1b[?1049h\x1b[H\x1b[2J")
+
+    def close(self):
+        """恢复终端原来的状态"""
+        self.write_now("\x1b[0m\x1b[?25h\x1b[?1049l")
+        if sys.platform != "win32":
+            signal.signal(signal.SIGWINCH, self._saved_winch or signal.SIG_DFL)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            termios.tcsetattr(self._fd_in, termios.TCSADRAIN, self._saved_tty)
+
+    @staticmethod
+    def _enable_vt_mode():
+        """在Windows控制台中启用ANSI转义序列和UTF-8输出"""
+        try:
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+            mode = ctypes.c_uint32()
+            if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+                kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+            kernel32.SetConsoleOutputCP(65001)
+        except (AttributeError, OSError):
+            pass
+
+    def _on_winch(self, signum, frame):
+        try:
+            os.write(self._wake_w, b"r")
+        except OSError:
+            pass
+
+    # ---------------------------------------------------------- 输出
+
+    def _query_size(self):
+        try:
+            size = os.get_terminal_size(self._fd_out)
+        except OSError:
+            size = shutil.get_terminal_size()
+        return size.lines, size.columns
+
+    def getmaxyx(self):
+        return self._size
+
+    def write_now(self, data: str):
+        """立即写出（不经过缓冲区）"""
+        raw = data.encode("utf-8")
+        while raw:
+            raw = raw[os.write(self._fd_out, raw):]
+
+    def addstr(self, *args):
+        """addstr(y, x, text[, attr])；超出屏幕的部分被截掉，写到右下角时与curses一样抛出error"""
+        if len(args) < 3:
+            raise TypeError("addstr()需要坐标参数: addstr(y, x, text[, attr])")
+        y, x, text = args[:3]
+        attr = args[3] if len(args) > 3 else self._attr
+        h, w = self._size
+        if not (0 <= y < h and 0 <= x < w):
+            raise error("addstr() 坐标超出窗口范围")
+        # 最后一行写满会让终端滚屏，因此最后一行少写一格
+        cells = w - x - (1 if y == h - 1 else 0)
+        clipped = _clip(text, cells)
+        self._buffer.append(f"\x1b[{y + 1};{x + 1}H{_sgr(attr)}{clipped}")
+        if y == h - 1 and clipped != text:
+            raise error("addstr() 写到了窗口右下角")
+
+    def attron(self, attr: int):
+        self._attr |= attr
+
+    def attroff(self, attr: int):
+        self._attr &= ~attr
+
+    def clear(self):
+        """清屏：丢弃还没有写出的内容，下一次refresh()先清除整个屏幕"""
+        self._buffer = ["\x1b[0m\x1b[2J"]
+
+    erase = clear
+
+    def refresh(self):
+        """把缓冲区中的内容一次写出"""
+        if self._buffer:
+            self._buffer.append("\x1b[0m")
+            self.write_now("".join(self._buffer))
+            self._buffer = []
+
+    # ---------------------------------------------------------- 输入
+
+    def timeout(self, delay: int):
+        self._delay = delay
+
+    def nodelay(self, flag: bool):
+        self._delay = 0 if flag else -1
+
+    def flush_input(self):
+        self._pending.clear()
+        if sys.platform == "win32":
+            while msvcrt.kbhit():
+                msvcrt.getwch()
+        else:
+            termios.tcflush(self._fd_in, termios.TCIFLUSH)
+
+    def _resized(self) -> bool:
+        size = self._query_size()
+        if size != self._size:
+            self._size = size
+            return True
+        return False
+
+    def getch(self) -> int:
+        """读取一个按键，按timeout()/nodelay()的设置等待，没有按键时返回-1"""
+        timeout = None if self._delay < 0 else self._delay / 1000
+        if sys.platform == "win32":
+            return self._getch_windows(timeout)
+        return self._getch_posix(timeout)
+
+    def _wait_input(self, timeout) -> bool:
+        """等待终端有输入可读；期间窗口大小变化时返回False"""
+        ready, _, _ = select.select([self._fd_in, self._wake_r], [], [], timeout)
+        if self._wake_r in ready:
+            try:
+                os.read(self._wake_r, 64)
+            except BlockingIOError:
+                pass
+            return False
+        return bool(ready)
+
+    def _fill(self, timeout) -> bool:
+        """读取终端中已有的输入到_pending，返回是否读到"""
+        if not self._wait_input(timeout):
+            return False
+        data = os.read(self._fd_in, 1024)
+        if not data:
+            raise EOFError("终端输入已关闭")
+        self._pending += data
+        return True
+
+    def _getch_posix(self, timeout) -> int:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if not self._pending:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if not self._fill(remaining):
+                    if self._resized():
+                        return KEY_RESIZE
+                    if deadline is None or time.monotonic() < deadline:
+                        continue
+                    return -1
+            key = self._pending.pop(0)
+            if key == 13:
+                return 10
+            if key != 27:
+                return key
+            # ESC：后面紧跟'['或'O'时是方向键等功能键的转义序列，整段丢弃
+            if not self._pending:
+                self._fill(ESC_DELAY)
+            if not self._pending or self._pending[0] not in b"[O":
+                return 27
+            end = 1
+            while True:
+                while end >= len(self._pending):
+                    if not self._fill(ESC_DELAY):
+                        break
+                if end >= len(self._pending) or 0x40 <= self._pending[end] <= 0x7E:
+                    break
+                end += 1
+            del self._pending[:end + 1]
+
+    def _getch_windows(self, timeout) -> int:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._resized():
+                return KEY_RESIZE
+            if msvcrt.kbhit():
+                char = msvcrt.getwch()
+                if char in ("\x00", "\xe0"):
+                    # 方向键、功能键：后面还有一个扫描码，整体忽略
+                    msvcrt.getwch()
+                    continue
+                if char == "\x03":
+                    raise KeyboardInterrupt
+                return 10 if char == "\r" else ord(char)
+            if deadline is not None and time.monotonic() >= deadline:
+                return -1
+            time.sleep(0.005)
+
+
+def wrapper(func, *args, **kwargs):
+    """与curses.wrapper相同：准备好终端后调用func(窗口, ...)，结束（包括出错）时恢复终端"""
+    global _screen
+    _screen = AnsiWindow()
+    _screen.open()
+    try:
+        return func(_screen, *args, **kwargs)
+    finally:
+        _screen.close()
+        _screen = None
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+打字练习游戏 - 性能基准
+测量终端版（假curses窗口）和图形版（SDL_VIDEODRIVER=dummy）热点函数的耗时，
+覆盖40到5万字符的文本长度和不同的粒子数量，结果写入JSON文件以便前后对比
+
+用法：
+    python typing_bench.py                          # 全部测试，写入 bench_results.json
+    python typing_bench.py --only terminal --quick  # 只测终端版，缩短每项时间
+    python typing_bench.py -o after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+# 必须在导入pygame之前设置，图形版在无显示器环境下也能运行
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+PASSAGE_LENGTHS = [40, 200, 1000, 5000, 20000, 50000]
+PARTICLE_COUNTS = [0, 100, 1000, 5000]
+
+SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Programs must be written for people to read, and only incidentally for machines to execute.",
+    "def fibonacci(n): return n if n <= 1 else fibonacci(n-1) + fibonacci(n-2)",
+    "Simplicity is the soul of efficiency in coding.",
+    "[x**2 for x in range(10) if x % 2 == 0]",
+]
+
+
+def make_passage(length: int, seed: int = 0) -> str:
+    """拼接示例句子生成指定长度的练习文本"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < length:
+        sentence = rng.choice(SENTENCES)
+        parts.append(sentence)
+        total += len(sentence) + 1
+    return " ".join(parts)[:length]
+
+
+def type_into(session, text: str, count: int, error_every: int = 17):
+    """向一局练习中输入前count个字符，每隔error_every个字符打错一个"""
+    t_ns = 1
+    for i in range(count):
+        char = text[i] if i % error_every else "#"
+        session.type_char(char, t_ns)
+        t_ns += 150_000_000
+
+
+class Bench:
+    """计时器：重复调用被测函数直到用完时间预算，记录每次调用的耗时"""
+
+    MIN_RUNS = 5
+    MAX_RUNS = 100000
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.results = []
+
+    def run(self, name: str, func, setup=None, **params):
+        """
+        测量func的单次调用耗时
+        有setup时每次调用前先执行setup（不计时）；否则把很快的函数合并成一批计时以减小误差
+        """
+        if setup:
+            setup()
+        func()  # 预热
+
+        inner = 1
+        if setup is None:
+            t0 = time.perf_counter_ns()
+            func()
+            once = max(time.perf_counter_ns() - t0, 1)
+            inner = max(1, 100_000 // once)  # 每批至少约0.1毫秒
+
+        samples = []
+        deadline = time.perf_counter() + self.budget
+        while len(samples) < self.MAX_RUNS and (
+                len(samples) < self.MIN_RUNS or time.perf_counter() < deadline):
+            if setup:
+                setup()
+            t0 = time.perf_counter_ns()
+            for _ in range(inner):
+                func()
+            samples.append((time.perf_counter_ns() - t0) / inner)
+
+        samples.sort()
+        result = {
+            "name": name,
+            "params": params,
+            "runs": len(samples) * inner,
+            "median_us": statistics.median(samples) / 1000,
+            "p95_us": samples[min(len(samples) - 1, int(len(samples) * 0.95))] / 1000,
+            "min_us": samples[0] / 1000,
+        }
+        self.results.append(result)
+        label = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"  {name:<34} {label:<28} {result['median_us']:>12.1f} us")
+        return result
+
+
+# ---------------------------------------------------------------- 终端版
+
+class FakeWindow:
+    """假的curses窗口：只统计写入次数，不做任何输出"""
+
+    def __init__(self, height: int = 50, width: int = 160):
+        self.height = height
+        self.width = width
+        self.writes = 0
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addstr(self, *args):
+        self.writes += 1
+
+    def getch(self):
+        return -1
+
+    def clear(self):
+        pass
+
+    erase = refresh = clear
+
+    def timeout(self, delay):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def attron(self, attr):
+        pass
+
+    attroff = attron
+
+
+def fake_curses_module():
+    """提供终端版用到的curses常量和函数的假模块"""
+    fake = types.SimpleNamespace(
+        error=Exception,
+        A_BOLD=1 << 21, A_UNDERLINE=1 << 17, A_NORMAL=0,
+        COLOR_BLACK=0, COLOR_RED=1, COLOR_GREEN=2, COLOR_YELLOW=3,
+        COLOR_BLUE=4, COLOR_MAGENTA=5, COLOR_CYAN=6, COLOR_WHITE=7,
+        KEY_BACKSPACE=263, KEY_RESIZE=410,
+    )
+    fake.color_pair = lambda n: n << 8
+    fake.start_color = fake.init_pair = fake.curs_set = fake.flushinp = lambda *a: None
+    return fake
+
+
+def bench_terminal(bench: Bench, lengths):
+    import typing_game
+    typing_game.curses = fake_curses_module()
+
+    print("终端版 (typing_game.py)")
+    window = FakeWindow()
+    game = typing_game.TypingGame(window)
+    max_width = window.width - 6
+
+    for length in lengths:
+        text = make_passage(length)
+        game.current_text = text
+        game.session.reset(text)
+        type_into(game.session, text, length // 2)
+
+        def redraw():
+            # 每次都让输入变化一个字符，模拟一次按键后的重绘
+            game.session.type_char("x", 1)
+            game.draw_game_screen()
+            game.session.backspace(1)
+
+        bench.run("TypingGame.draw_game_screen", redraw, length=length)
+        bench.run("TypingGame.wrap_text", lambda: game.wrap_text(text, max_width), length=length)
+        bench.run("TypingGame.calculate_accuracy", game.calculate_accuracy, length=length)
+        bench.run("TypingGame.calculate_wpm", game.calculate_wpm, length=length)
+
+
+# ---------------------------------------------------------------- 图形版
+
+def bench_gui(bench: Bench, lengths, particle_counts):
+    import typing_game_gui
+    COLORS = typing_game_gui.COLORS
+
+    print("图形版 (typing_game_gui.py)")
+    game = typing_game_gui.TypingGameGUI()
+    game.state = "playing"
+
+    for length in lengths:
+        text = make_passage(length)
+        game.current_text = text
+        game.session.reset(text)
+        type_into(game.session, text, length // 2)
+        game.particles.clear()
+
+        bench.run("TypingGameGUI.draw_game_screen", game.draw_game_screen, length=length)
+        bench.run("TypingGameGUI.draw_stats", game.draw_stats, length=length)
+        bench.run("TypingGameGUI.draw_wrapped_text",
+                  lambda: game.draw_wrapped_text(text, 70, 140, typing_game_gui.WINDOW_WIDTH - 140,
+                                                 game.fonts['text'], COLORS['text']),
+                  length=length)
+
+    # 长文模式：每帧只绘制视口中可见的几行，耗时应与文本长度无关
+    from typing_passage import PassageFile
+    with tempfile.TemporaryDirectory() as tmp:
+        for length in lengths:
+            path = os.path.join(tmp, f"passage-{length}.txt")
+            with open(path, "w", encoding="ascii") as f:
+                f.write(make_passage(length))
+            with PassageFile(path) as passage:
+                game.passage = passage
+                game.prepare_game()
+                type_into(game.session, passage, length // 2)
+                view = game.passage_view
+                view.update(game.session.position)
+                while view.scrolling:
+                    view.update(game.session.position)
+                bench.run("TypingGameGUI.draw_passage_screen", game.draw_game_screen, length=length)
+                game.passage = game.passage_view = None
+
+    rng = random.Random(0)
+    colors = [COLORS['correct'], COLORS['error'], COLORS['highlight'], COLORS['accent']]
+    for count in particle_counts:
+        max_life = typing_game_gui.ParticlePool.MAX_LIFE
+        per_frame = count // max_life
+        bursts = [(rng.uniform(100, 900), rng.uniform(100, 600), rng.choice(colors))
+                  for _ in range(max_life)]
+
+        def reset_particles():
+            # 每次测量前重新产生同一批粒子：连续max_life帧每帧一批，各种剩余寿命的粒子都有，
+            # 与游戏中持续输入时的状态相同，保证各次测量的工作量相同
+            random.seed(count)
+            game.particles.clear()
+            for i, (x, y, color) in enumerate(bursts):
+                if i:
+                    game.particles.update()
+                game.particles.burst(x, y, color, per_frame)
+
+        bench.run("TypingGameGUI.update_particles", game.update_particles,
+                  setup=reset_particles, particles=count)
+        reset_particles()
+        bench.run("TypingGameGUI.draw_particles", game.draw_particles, particles=count)
+
+    game.particles.clear()
+
+
+# ---------------------------------------------------------------- 结果
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def result_key(result: dict):
+    return result["name"], tuple(sorted(result["params"].items()))
+
+
+def compare(old: dict, new: dict):
+    """打印两次运行的中位数耗时对比"""
+    old_map = {result_key(r): r for r in old["results"]}
+    print(f"\n{'测试项':<34} {'参数':<20} {'之前(us)':>12} {'之后(us)':>12} {'倍数':>8}")
+    for r in new["results"]:
+        before = old_map.get(result_key(r))
+        if before is None:
+            continue
+        label = " ".join(f"{k}={v}" for k, v in r["params"].items())
+        ratio = before["median_us"] / r["median_us"] if r["median_us"] else float("inf")
+        print(f"{r['name']:<34} {label:<20} {before['median_us']:>12.1f} "
+              f"{r['median_us']:>12.1f} {ratio:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="打字练习游戏性能基准")
+    parser.add_argument("--only", choices=["terminal", "gui"], help="只测试一个版本")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="结果文件（JSON）")
+    parser.add_argument("--compare", metavar="FILE", help="与之前的结果文件对比")
+    parser.add_argument("--quick", action="store_true", help="缩短每项测试的时间预算")
+    parser.add_argument("--max-length", type=int, default=max(PASSAGE_LENGTHS),
+                        help="最长的测试文本长度")
+    args = parser.parse_args(argv)
+
+    bench = Bench(budget=0.05 if args.quick else 0.3)
+    lengths = [n for n in PASSAGE_LENGTHS if n <= args.max_length]
+
+    if args.only in (None, "terminal"):
+        bench_terminal(bench, lengths)
+    if args.only in (None, "gui"):
+        try:
+            import pygame
+        except ImportError:
+            print("未安装pygame，跳过图形版测试")
+        else:
+            bench_gui(bench, lengths, PARTICLE_COUNTS)
+
+    data = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pygame": sys.modules["pygame"].version.ver if "pygame" in sys.modules else None,
+            "budget_s": bench.budget,
+        },
+        "results": bench.results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    print(f"\n结果已写入 {args.output}")
+
+    if args.compare:
+        compare(load_results(args.compare), data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+"""
+打字练习游戏 - 核心逻辑
+终端版和图形界面版共用的输入缓冲、计分、按键记录等与界面无关的部分
+"""
+
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, List, Tuple
+
+# 本地数据目录（历史成绩等）
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".typing_game")
+
+# 按键记录中表示退格的码点
+BACKSPACE_CODE = 8
+# 按键记录最多预分配的条数（长篇文本不按全文长度预分配，用完后再扩容）
+KEYLOG_PREALLOC_MAX = 1 << 16
+
+
+class InputBuffer:
+    """
+    用户输入缓冲区
+    以码点数组保存已输入的字符，追加和退格都是O(1)，不会像字符串拼接那样每次复制整段输入
+    """
+
+    def __init__(self, text: str = ""):
+        self._codes = array("I", map(ord, text))
+
+    def append(self, char: str):
+        """追加一个字符"""
+        self._codes.append(ord(char))
+
+    def pop(self) -> str:
+        """删除并返回最后一个字符"""
+        return chr(self._codes.pop())
+
+    def clear(self):
+        """清空输入"""
+        del self._codes[:]
+
+    def text(self, start: int = 0, end: int = None) -> str:
+        """取出[start, end)范围内的文本，用于渲染可见部分"""
+        return "".join(map(chr, self._codes[start:end]))
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return "".join(map(chr, self._codes[index]))
+        return chr(self._codes[index])
+
+    def __iter__(self):
+        return map(chr, self._codes)
+
+    def __str__(self) -> str:
+        return self.text()
+
+    def __repr__(self) -> str:
+        return f"InputBuffer({self.text()!r})"
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, InputBuffer):
+            return self._codes == other._codes
+        if isinstance(other, str):
+            return self.text() == other
+        return NotImplemented
+
+
+class ScoreTracker:
+    """
+    增量计分器
+    每次按键和退格时更新计数，准确率、错误数和WPM的查询都是O(1)，与文本长度无关
+    """
+
+    def __init__(self, target: str = ""):
+        self.reset(target)
+
+    def reset(self, target: str):
+        """开始新的一局"""
+        self.target = target
+        self.marks = bytearray()  # 当前输入中每个位置是否正确
+        self.correct = 0          # 当前输入中正确的字符数
+        self.incorrect = 0        # 当前输入中错误的字符数
+        self.typed = 0            # 累计输入的字符数（包括之后被删除的）
+        self.mistakes = 0         # 累计输入错误的字符数（包括之后被删除的）
+        self.backspaces = 0       # 累计退格次数
+        self.combo = 0            # 当前连击数
+        self.max_combo = 0        # 最高连击数
+
+    def type_char(self, char: str) -> bool:
+        """记录输入的一个字符，返回是否正确"""
+        pos = len(self.marks)
+        ok = pos < len(self.target) and char == self.target[pos]
+        self.marks.append(ok)
+        self.typed += 1
+        if ok:
+            self.correct += 1
+            self.combo += 1
+            if self.combo > self.max_combo:
+                self.max_combo = self.combo
+        else:
+            self.incorrect += 1
+            self.mistakes += 1
+            self.combo = 0
+        return ok
+
+    def backspace(self) -> bool:
+        """记录一次退格，返回是否删除了字符"""
+        if not self.marks:
+            return False
+        if self.marks.pop():
+            self.correct -= 1
+        else:
+            self.incorrect -= 1
+        self.backspaces += 1
+        self.combo = 0
+        return True
+
+    def is_correct(self, pos: int) -> bool:
+        """当前输入中第pos个字符是否正确"""
+        return bool(self.marks[pos])
+
+    @property
+    def length(self) -> int:
+        """当前输入的字符数"""
+        return len(self.marks)
+
+    @property
+    def errors(self) -> int:
+        """错误数：累计输入的字符中不正确的数量（包括已删除的错误，删除后重新输入正确的字符不算）"""
+        return self.mistakes
+
+    def accuracy(self) -> float:
+        """准确率（百分比）"""
+        if not self.marks:
+            return 100.0
+        return self.correct / len(self.marks) * 100
+
+    def wpm(self, elapsed_time: float) -> float:
+        """每分钟单词数（WPM），按每5个字符一个单词计算"""
+        minutes = elapsed_time / 60
+        if minutes <= 0:
+            return 0.0
+        return len(self.marks) / 5 / minutes
+
+
+class KeystrokeLog:
+    """
+    按键事件记录
+    每次按键保存单调时钟纳秒时间戳、应输入的字符、实际输入的字符和是否为退格。
+    数据存放在预分配的定长数组中，记录一次按键只是几次数组赋值，不产生新对象
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.reset(capacity)
+
+    def reset(self, capacity: int = 256):
+        """清空记录并按预计的按键数预分配空间"""
+        capacity = max(capacity, 16)
+        self.count = 0
+        self.t_ns = array("q", [0]) * capacity
+        self.expected = array("I", [0]) * capacity  # 应输入字符的码点，超出目标文本时为0
+        self.typed = array("I", [0]) * capacity     # 实际输入字符的码点，退格为BACKSPACE_CODE
+        self.backspace = bytearray(capacity)
+
+    def record(self, t_ns: int, expected: int, typed: int, is_backspace: bool = False):
+        """记录一次按键"""
+        i = self.count
+        if i == len(self.t_ns):
+            self._grow()
+        self.t_ns[i] = t_ns
+        self.expected[i] = expected
+        self.typed[i] = typed
+        self.backspace[i] = is_backspace
+        self.count = i + 1
+
+    def _grow(self):
+        """空间用完时容量翻倍"""
+        n = len(self.t_ns)
+        self.t_ns.extend(array("q", [0]) * n)
+        self.expected.extend(array("I", [0]) * n)
+        self.typed.extend(array("I", [0]) * n)
+        self.backspace.extend(bytearray(n))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def intervals(self) -> List[int]:
+        """相邻两次按键之间的间隔（纳秒）"""
+        t = self.t_ns
+        return [t[i] - t[i - 1] for i in range(1, self.count)]
+
+    def hesitations(self, threshold_ns: int = 1_000_000_000) -> List[Tuple[int, int]]:
+        """停顿：间隔超过threshold_ns的按键，返回(按键序号, 间隔纳秒)"""
+        t = self.t_ns
+        return [(i, t[i] - t[i - 1]) for i in range(1, self.count)
+                if t[i] - t[i - 1] > threshold_ns]
+
+    def digraph_times(self) -> Dict[str, List[int]]:
+        """双字符组合的输入间隔：只统计连续两次都正确输入的字符，键为两个字符组成的字符串"""
+        result = {}
+        t, expected, typed, bs = self.t_ns, self.expected, self.typed, self.backspace
+        for i in range(1, self.count):
+            if (bs[i] or bs[i - 1] or typed[i] != expected[i]
+                    or typed[i - 1] != expected[i - 1]):
+                continue
+            digraph = chr(typed[i - 1]) + chr(typed[i])
+            result.setdefault(digraph, []).append(t[i] - t[i - 1])
+        return result
+
+    def to_dict(self) -> dict:
+        """转换为可JSON序列化的字典"""
+        n = self.count
+        return {
+            "t_ns": self.t_ns[:n].tolist(),
+            "expected": self.expected[:n].tolist(),
+            "typed": self.typed[:n].tolist(),
+            "backspace": list(self.backspace[:n]),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KeystrokeLog":
+        """从to_dict()的结果恢复"""
+        log = cls(len(data["t_ns"]))
+        for t_ns, expected, typed, bs in zip(data["t_ns"], data["expected"],
+                                            data["typed"], data["backspace"]):
+            log.record(t_ns, expected, typed, bool(bs))
+        return log
+
+    # 二进制格式：条数(uint32) + 时间戳(int64) + 应输入码点(uint32) + 实际码点(uint32) + 退格标记(uint8)，小端序
+    _HEADER = struct.Struct("<I")
+
+    def to_bytes(self) -> bytes:
+        """序列化为紧凑的二进制格式（随历史记录一起保存）"""
+        n = self.count
+        parts = [self._HEADER.pack(n)]
+        for arr in (self.t_ns[:n], self.expected[:n], self.typed[:n]):
+            if sys.byteorder == "big":
+                arr.byteswap()
+            parts.append(arr.tobytes())
+        parts.append(bytes(self.backspace[:n]))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "KeystrokeLog":
+        """从to_bytes()的结果恢复"""
+        (n,) = cls._HEADER.unpack_from(data)
+        log = cls(n)
+        offset = cls._HEADER.size
+        for name in ("t_ns", "expected", "typed"):
+            arr = array(getattr(log, name).typecode)
+            size = n * arr.itemsize
+            arr.frombytes(data[offset:offset + size])
+            if sys.byteorder == "big":
+                arr.byteswap()
+            getattr(log, name)[:n] = arr
+            offset += size
+        log.backspace[:n] = data[offset:offset + n]
+        log.count = n
+        return log
+
+
+def percentile(sorted_values, p: float):
+    """已排序序列的p分位数（0~1，取最近的样本）"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class LatencyMeter:
+    """
+    按键到显示的延迟测量
+    key()记录按键被处理的时刻，frame()在第一次把它显示出来的帧提交（flip/refresh返回）后调用，
+    两者之差按渲染路径分别保存。每局开始时调用begin_session()，延迟分布按局和渲染路径汇总。
+    时间戳使用单调时钟的纳秒值（time.perf_counter_ns()）
+    """
+
+    def __init__(self, frontend: str):
+        self.frontend = frontend
+        self.sessions = []   # 已结束的各局：(名称, {渲染路径: 延迟数组})
+        self.label = None    # 当前一局的名称，begin_session()之前为None
+        self.samples = {}    # 当前一局：渲染路径 -> 延迟（纳秒）数组
+        self.pending = array("q")  # 已处理但还没有显示的按键时刻
+
+    def begin_session(self, label: str):
+        """开始新的一局；上一局有数据时保存下来"""
+        self.end_session()
+        self.label = label
+
+    def end_session(self):
+        """结束当前一局，还没有显示的按键不计入"""
+        if self.samples:
+            self.sessions.append((self.label, self.samples))
+        self.samples = {}
+        del self.pending[:]
+
+    def key(self, t_ns: int):
+        """记录一次会改变显示的按键"""
+        self.pending.append(t_ns)
+
+    def frame(self, path: str, t_ns: int):
+        """一帧已提交显示：之前记录的按键都在这一帧中第一次显示"""
+        if not self.pending:
+            return
+        samples = self.samples.get(path)
+        if samples is None:
+            samples = self.samples[path] = array("q")
+        samples.extend(t_ns - t for t in self.pending)
+        del self.pending[:]
+
+    def __len__(self) -> int:
+        """已测量的按键数（包括当前一局）"""
+        return (sum(len(values) for _, samples in self.sessions for values in samples.values())
+                + sum(len(values) for values in self.samples.values()))
+
+    @staticmethod
+    def distribution(samples) -> dict:
+        """延迟分布（毫秒）"""
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "p50_ms": percentile(ordered, 0.5) / 1e6,
+            "p95_ms": percentile(ordered, 0.95) / 1e6,
+            "p99_ms": percentile(ordered, 0.99) / 1e6,
+            "max_ms": ordered[-1] / 1e6,
+        }
+
+    def to_dict(self) -> dict:
+        """各局和全部各局按渲染路径的延迟分布（包括当前一局）"""
+        sessions = list(self.sessions)
+        if self.samples:
+            sessions.append((self.label, self.samples))
+        totals = {}
+        for _, samples in sessions:
+            for path, values in samples.items():
+                totals.setdefault(path, array("q")).extend(values)
+        return {
+            "frontend": self.frontend,
+            "sessions": [{"label": label,
+                          "paths": {path: self.distribution(values) for path, values in samples.items()}}
+                         for label, samples in sessions],
+            "total": {path: self.distribution(values) for path, values in totals.items()},
+        }
+
+    def report(self) -> str:
+        """可读的延迟报告"""
+        data = self.to_dict()
+        lines = [f"按键到显示延迟（{data['frontend']}，毫秒）"]
+        if not len(self):
+            lines.append("没有样本（没有测量到按键）")
+            return "\n".join(lines)
+        lines.append(f"{'':<16}{'渲染路径':<14}{'按键数':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'最大':>9}")
+        rows = [(f"第{i}局 {s['label']}", s["paths"]) for i, s in enumerate(data["sessions"], 1)]
+        rows.append(("全部", data["total"]))
+        for name, paths in rows:
+            for path, d in sorted(paths.items()):
+                lines.append(f"{name:<16}{path:<14}{d['count']:>8}{d['p50_ms']:>9.2f}"
+                             f"{d['p95_ms']:>9.2f}{d['p99_ms']:>9.2f}{d['max_ms']:>9.2f}")
+                name = ""
+        return "\n".join(lines)
+
+    def save(self, directory: str = DATA_DIR) -> str:
+        """把延迟分布写入数据目录下的JSON文件，返回文件路径"""
+        path = os.path.join(directory, time.strftime(f"latency-{self.frontend}-%Y%m%d-%H%M%S.json"))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        return path
+
+
+def is_typable(char: str) -> bool:
+    """是否为可练习输入的字符（可打印ASCII）"""
+    return 32 <= ord(char) <= 126
+
+
+class TypingSession:
+    """
+    一局练习的输入状态
+    统一处理字符输入、退格、计时和完成检测，终端版、图形版和无界面回放共用这一套逻辑。
+    时间戳使用单调时钟的纳秒值（time.perf_counter_ns()）
+    """
+
+    def __init__(self, target: str = ""):
+        self.buffer = InputBuffer()
+        self.score = ScoreTracker()
+        self.keylog = KeystrokeLog()
+        self.reset(target)
+
+    def reset(self, target: str):
+        """开始新的一局（复用原有的输入缓冲和计分器对象）"""
+        self.target = target
+        self.target_len = len(target)
+        self.position = 0  # 当前输入长度（光标位置）
+        self.buffer.clear()
+        self.score.reset(target)
+        # 预留改错（输入+退格）的空间，避免练习中扩容
+        self.keylog.reset(min(self.target_len * 2, KEYLOG_PREALLOC_MAX))
+        self.start_ns = 0
+        self.end_ns = 0
+        self.started_at = 0.0  # 开始输入时的墙上时间，用于记录保存
+        self.is_running = False
+        self.finished = False
+
+    def type_char(self, char: str, now_ns: int) -> bool:
+        """输入一个字符，第一次输入时开始计时，返回是否正确"""
+        if not self.is_running:
+            self.start_ns = now_ns
+            self.started_at = time.time()
+            self.is_running = True
+        pos = self.position
+        self.keylog.record(now_ns, ord(self.target[pos]) if pos < self.target_len else 0,
+                           ord(char))
+        self.buffer.append(char)
+        ok = self.score.type_char(char)
+        self.position = pos + 1
+        
+        # 检查是否完成
+        if pos + 1 >= self.target_len:
+            self.end_ns = now_ns
+            self.finished = True
+        return ok
+
+    def backspace(self, now_ns: int) -> bool:
+        """退格，返回是否删除了字符"""
+        pos = self.position
+        self.keylog.record(now_ns, ord(self.target[pos - 1]) if 0 < pos <= self.target_len else 0,
+                           BACKSPACE_CODE, True)
+        if not pos:
+            return False
+        self.buffer.pop()
+        self.position = pos - 1
+        return self.score.backspace()
+
+    def elapsed(self, now_ns: int = 0) -> float:
+        """已用时间（秒），完成后固定为完成时的用时"""
+        if not self.is_running:
+            return 0.0
+        end = self.end_ns if self.finished else now_ns
+        return (end - self.start_ns) / 1e9
+
+    def wpm(self, now_ns: int = 0) -> float:
+        """每分钟单词数（WPM）"""
+        return self.score.wpm(self.elapsed(now_ns))
+
+    def progress(self) -> float:
+        """进度（0~1）"""
+        return self.position / self.target_len if self.target_len else 0.0
+
+    def summary(self) -> dict:
+        """本局的最终统计（用于保存历史记录）"""
+        score = self.score
+        return {
+            "started_at": self.started_at,
+            "elapsed": self.elapsed(),
+            "wpm": self.wpm(),
+            "accuracy": score.accuracy(),
+            "chars": self.position,
+            "errors": score.errors,
+            "backspaces": score.backspaces,
+            "max_combo": score.max_combo,
+        }
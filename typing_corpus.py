@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+打字练习游戏 - 外部语料
+为任意大小的文本语料（书籍、文档、日志等）建立一次性的句子/段落偏移索引，
+索引按难度和长度分桶保存在数据目录中，之后的运行只要语料没有变化就直接复用。
+语料和索引都用mmap映射，随机抽取一段练习文本是O(1)的，不需要把文件读入内存
+"""
+
+import hashlib
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+from array import array
+from typing import Callable, Optional
+
+from typing_core import DATA_DIR
+
+INDEX_DIR = os.path.join(DATA_DIR, "corpus")
+
+# 与两个界面的TEXTS相同的难度，索引中以下标保存
+DIFFICULTIES = ("简单", "中等", "困难", "编程挑战")
+
+# 可作为练习文本的句子/段落长度（字节，空白合并之前）
+MIN_LENGTH = 20
+MAX_LENGTH = 120
+LENGTH_BIN = 16  # 长度分桶的宽度
+
+# 难度划分：代码符号比例达到CODE_SYMBOL_RATIO的归为编程挑战，其余按长度（不超过上限）
+CODE_SYMBOL_RATIO = 0.08
+LENGTH_LIMITS = ((45, "简单"), (70, "中等"), (MAX_LENGTH, "困难"))
+
+# 建立索引时每次扫描的字节数
+SCAN_CHUNK = 1 << 24
+
+# 句子/段落的结尾：句末标点（可以跟着引号或右括号）后面是空白，或者空行
+_BOUNDARY = re.compile(rb"[.!?]+[\"')\]]*(?=\s)|\n[ \t\r\f\v]*\n")
+# 可以输入的字节：可打印ASCII和空白（空白在取出时合并为一个空格）
+_ALLOWED = bytes(range(32, 127)) + b"\t\n\r\f\v"
+# 普通文字中的字节：字母、数字、空白和常见标点，其余算作代码符号
+_PLAIN = (b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+          b" \t\n\r\f\v.,;:'\"!?-")
+
+# 索引文件格式（小端序）：
+#   文件头：魔数、版本、语料大小、语料修改时间(ns)、桶数
+#   桶表：每个桶(难度下标, 长度桶号, 第一条记录的序号, 记录数)，按(难度, 长度)排序
+#   记录：全部句子的起始偏移(uint64)数组，然后是长度(uint16)数组，同一个桶的记录连续存放
+_MAGIC = b"TYPCORP\x00"
+_VERSION = 2
+_HEADER = struct.Struct("<8sIQqI")
+_BUCKET = struct.Struct("<BBxxxxxxQQ")
+_OFFSET = struct.Struct("<Q")
+_LENGTH = struct.Struct("<H")
+
+
+def classify(sentence: bytes) -> int:
+    """句子的难度下标"""
+    if len(sentence.translate(None, _PLAIN)) >= len(sentence) * CODE_SYMBOL_RATIO:
+        return DIFFICULTIES.index("编程挑战")
+    for limit, name in LENGTH_LIMITS:
+        if len(sentence) <= limit:
+            return DIFFICULTIES.index(name)
+    return DIFFICULTIES.index(LENGTH_LIMITS[-1][1])
+
+
+def index_path(path: str) -> str:
+    """语料对应的索引文件路径（按语料的绝对路径区分）"""
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(INDEX_DIR, f"{os.path.basename(path)}-{digest[:16]}.idx")
+
+
+class Corpus:
+    """
+    外部语料
+    第一次打开时扫描全文建立索引（分块映射扫描，内存占用与语料大小无关，只与句子数有关），
+    索引文件记录语料的大小和修改时间，语料变化后自动重建。
+    sample()从指定难度的桶中随机取一句，只读取索引中的一条记录和语料中的这一段
+    """
+
+    def __init__(self, path: str, on_build: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            stat = os.fstat(self._file.fileno())
+            if stat.st_size == 0:
+                raise ValueError(f"语料文件为空: {path}")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self._index = None
+        self._index_map = None
+
+        try:
+            if not self._open_index(index_path(path)):
+                if on_build is not None:
+                    on_build(path)
+                self._build_index(index_path(path))
+            if not self.count:
+                raise ValueError(f"语料中没有长度合适的纯ASCII句子: {path}")
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def name(self) -> str:
+        """文件名（用于界面显示）"""
+        return os.path.basename(self.path)
+
+    # ---------------------------------------------------------- 索引
+
+    def _load(self, data) -> bool:
+        """读取索引的文件头和桶表，语料已经变化（或不是索引文件）时返回False"""
+        if len(data) < _HEADER.size:
+            return False
+        magic, version, size, mtime_ns, n_buckets = _HEADER.unpack_from(data)
+        if (magic, version, size, mtime_ns) != (_MAGIC, _VERSION, self.size, self.mtime_ns):
+            return False
+        pos = _HEADER.size
+        self.buckets = []  # (难度下标, 长度桶号, 第一条记录的序号, 记录数)
+        for _ in range(n_buckets):
+            self.buckets.append(_BUCKET.unpack_from(data, pos))
+            pos += _BUCKET.size
+        self.count = sum(bucket[3] for bucket in self.buckets)
+        self._offsets_at = pos
+        self._lengths_at = pos + self.count * _OFFSET.size
+        if len(data) < self._lengths_at + self.count * _LENGTH.size:
+            return False
+        self._index = data
+        return True
+
+    def _open_index(self, path: str) -> bool:
+        """映射已有的索引文件，没有或已经过期时返回False"""
+        try:
+            with open(path, "rb") as f:
+                index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if self._load(index_map):
+            self._index_map = index_map
+            return True
+        index_map.close()
+        return False
+
+    @staticmethod
+    def _sentence(chunk: bytes, begin: int, stop: int):
+        """chunk[begin:stop]去掉两端空白后的(相对偏移, 长度, 难度下标)，不适合作为练习文本时返回None"""
+        sentence = chunk[begin:stop]
+        stripped = sentence.lstrip()
+        offset = begin + len(sentence) - len(stripped)
+        stripped = stripped.rstrip()
+        if (MIN_LENGTH <= len(stripped) <= MAX_LENGTH
+                and not stripped.translate(None, _ALLOWED)):
+            return offset, len(stripped), classify(stripped)
+        return None
+
+    def scan(self):
+        """逐句扫描语料，产生(偏移, 长度, 难度下标)；语料分块映射读取，不会整个读入内存"""
+        data_map = self._map
+        start = 0
+        skipped = False  # 上一块中没有句子结尾而被跳过，这一块从句子中间开始
+        while start < self.size:
+            end = min(start + SCAN_CHUNK, self.size)
+            chunk = data_map[start:end]
+            sentence_start = 0
+            for match in _BOUNDARY.finditer(chunk):
+                if skipped:
+                    # 第一个结尾之前是被跳过的那句的后半段，不是完整的句子
+                    sentence_start = match.end()
+                    skipped = False
+                    continue
+                found = self._sentence(chunk, sentence_start, match.end())
+                sentence_start = match.end()
+                if found is not None:
+                    yield start + found[0], found[1], found[2]
+            if end == self.size:
+                # 文件末尾的最后一句后面可能没有空白，_BOUNDARY匹配不到它的结尾
+                if not skipped:
+                    found = self._sentence(chunk, sentence_start, len(chunk))
+                    if found is not None:
+                        yield start + found[0], found[1], found[2]
+                break
+            # 最后一句可能跨到下一块，从它的开头继续扫描；整块都没有句子结尾时跳过这一块（太长了）
+            if sentence_start:
+                start += sentence_start
+            else:
+                start += len(chunk)
+                skipped = True
+
+    def _build_index(self, path: str):
+        """扫描语料建立索引，写入索引文件（无法写入时只保存在内存中）"""
+        buckets = {}  # (难度下标, 长度桶号) -> (偏移数组, 长度数组)
+        for offset, length, difficulty in self.scan():
+            key = (difficulty, (length - MIN_LENGTH) // LENGTH_BIN)
+            columns = buckets.get(key)
+            if columns is None:
+                columns = buckets[key] = (array("Q"), array("H"))
+            columns[0].append(offset)
+            columns[1].append(length)
+
+        keys = sorted(buckets)
+        parts = [_HEADER.pack(_MAGIC, _VERSION, self.size, self.mtime_ns, len(keys))]
+        first = 0
+        for key in keys:
+            count = len(buckets[key][0])
+            parts.append(_BUCKET.pack(key[0], key[1], first, count))
+            first += count
+        for column in (0, 1):
+            for key in keys:
+                values = buckets[key][column]
+                if sys.byteorder == "big":
+                    values.byteswap()
+                parts.append(values.tobytes())
+        data = b"".join(parts)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+        else:
+            if self._open_index(path):
+                return
+        self._load(data)
+
+    # ---------------------------------------------------------- 取文本
+
+    def count_for(self, difficulty: str) -> int:
+        """指定难度的句子数"""
+        level = DIFFICULTIES.index(difficulty)
+        return sum(bucket[3] for bucket in self.buckets if bucket[0] == level)
+
+    def passage(self, record: int) -> str:
+        """第record条记录对应的练习文本（空白合并为一个空格）"""
+        (offset,) = _OFFSET.unpack_from(self._index, self._offsets_at + record * _OFFSET.size)
+        (length,) = _LENGTH.unpack_from(self._index, self._lengths_at + record * _LENGTH.size)
+        return b" ".join(self._map[offset:offset + length].split()).decode("ascii")
+
+    def sample(self, difficulty: str, rng=random) -> Optional[str]:
+        """随机取一段指定难度的练习文本，这个难度没有句子时返回None"""
+        level = DIFFICULTIES.index(difficulty)
+        buckets = [bucket for bucket in self.buckets if bucket[0] == level]
+        total = sum(bucket[3] for bucket in buckets)
+        if not total:
+            return None
+        # 各长度桶按句子数加权，等同于在这个难度的全部句子中均匀抽取
+        k = rng.randrange(total)
+        for _, _, first, count in buckets:
+            if k < count:
+                return self.passage(first + k)
+            k -= count
+
+    def __repr__(self) -> str:
+        return f"Corpus({self.path!r}, sentences={self.count})"
+
+    def close(self):
+        """释放文件映射"""
+        if self._index_map is not None and not self._index_map.closed:
+            self._index_map.close()
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -6,35 +6,25 @@
 支持Windows/Linux/macOS
 """
 
+import argparse
 import time
 import random
 import sys
 import os
-from typing import List, Tuple
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
-# Windows兼容性处理
+from typing_core import LatencyMeter, TypingSession
+from typing_corpus import Corpus
+from typing_history import ALL, HistoryStore, open_history
+from typing_passage import PassageFile
+
+# 没有curses模块时（例如未安装windows-curses的Windows）使用纯ANSI终端后端
 try:
     import curses
-    CURSES_AVAILABLE = True
 except ImportError:
-    CURSES_AVAILABLE = False
-    # Windows上需要安装windows-curses
-    print("检测到Windows系统，正在尝试安装curses支持...")
-    try:
-        import subprocess
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "windows-curses", "-q"])
-        import curses
-        CURSES_AVAILABLE = True
-        print("✓ 安装成功！")
-    except:
-        print("\n" + "="*50)
-        print("❌ 无法自动安装curses库")
-        print("\n请手动运行以下命令安装：")
-        print("    pip install windows-curses")
-        print("\n或者使用图形界面版本：")
-        print("    python typing_game_gui.py")
-        print("="*50)
-        sys.exit(1)
+    import typing_ansi as curses
 
 # 不同难度的练习文本
 TEXTS = {
@@ -69,17 +59,217 @@ TEXTS = {
 }
 
 
-class TypingGame:
+@lru_cache(maxsize=4096)
+def char_width(char: str) -> int:
+    """字符在终端中占用的列数（中日韩全角字符占2列，组合字符占0列）"""
+    if unicodedata.combining(char) or unicodedata.category(char) in ("Mn", "Me", "Cf"):
+        return 0
+    return 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+
+
+def text_width(text: str) -> int:
+    """文本在终端中占用的列数"""
+    return sum(char_width(c) for c in text)
+
+
+def pad_to_width(text: str, width: int) -> str:
+    """在右侧补空格，使文本在终端中占width列"""
+    return text + " " * max(0, width - text_width(text))
+
+
+@lru_cache(maxsize=64)
+def wrap_lines(text: str, max_width: int) -> Tuple[str, ...]:
+    """将文本按宽度分行（结果按文本和宽度缓存，同一局中每次重绘直接复用）"""
+    lines = []
+    current_line = ""
+    for word in text.split():
+        if len(current_line) + len(word) + 1 <= max_width:
+            current_line += word + " "
+        else:
+            if current_line:
+                lines.append(current_line.rstrip())
+            current_line = word + " "
+    if current_line:
+        lines.append(current_line.rstrip())
+    return tuple(lines) if lines else (text[:max_width],)
+
+
+def format_duration(seconds: float) -> str:
+    """把秒数格式化为“X小时Y分”/“X分Y秒”"""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}小时{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: List[float]) -> str:
+    """用方块字符画出一组数值的走势"""
+    low, high = min(values), max(values)
+    span = high - low or 1
+    return "".join(SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1))] for v in values)
+
+
+# 全角字符右半部分的占位单元格
+WIDE_TAIL = ""
+
+
+class CellRenderer:
+    """
+    单元格差分渲染器
+    保存上一帧每个单元格的(字符, 属性)模型，刷新时只输出发生变化的单元格，
+    仅在窗口尺寸变化或切换界面后才整屏重绘，避免闪烁并减少终端输出量
+    """
+
+    BLANK = (" ", 0)
+    # 两段变化之间相隔不超过这么多个单元格时合并输出（比多一次光标移动更省）
+    MERGE_GAP = 4
+
     def __init__(self, stdscr):
         self.stdscr = stdscr
+        self.height = 0
+        self.width = 0
+        self.front = []  # 终端上当前显示的帧
+        self.back = []   # 正在绘制的帧
+        self.dirty_rows = set()
+        self.full_redraw = True
+        self.last_full = False  # 上一次刷新是否为整屏重绘
+
+    def invalidate(self):
+        """下一次刷新时整屏重绘（其他界面直接操作过屏幕后调用）"""
+        self.full_redraw = True
+
+    def begin_frame(self) -> Tuple[int, int]:
+        """开始绘制新的一帧，清空后台帧并返回窗口尺寸"""
+        h, w = self.stdscr.getmaxyx()
+        if (h, w) != (self.height, self.width):
+            self.height, self.width = h, w
+            self.full_redraw = True
+        self.back = [[self.BLANK] * w for _ in range(h)]
+        self.dirty_rows = set(range(h))
+        return h, w
+
+    def clear_rows(self, start: int, stop: int) -> bool:
+        """
+        清空后台帧中[start, stop)行，用于只重绘屏幕的一部分；
+        窗口尺寸已变化时返回False，此时应改为整帧绘制
+        """
+        if self.stdscr.getmaxyx() != (self.height, self.width):
+            return False
+        for y in range(max(start, 0), min(stop, self.height)):
+            self.back[y] = [self.BLANK] * self.width
+            self.dirty_rows.add(y)
+        return True
+
+    def put(self, y: int, x: int, text: str, attr: int = 0):
+        """在后台帧的(y, x)处写入文本，超出窗口的部分被裁剪"""
+        if not 0 <= y < self.height:
+            return
+        row = self.back[y]
+        width = self.width
+        for char in text:
+            cw = char_width(char)
+            if cw == 0:
+                continue
+            if x + cw > width:
+                break
+            if x >= 0:
+                row[x] = (char, attr)
+                if cw == 2:
+                    row[x + 1] = (WIDE_TAIL, attr)
+            x += cw
+        self.dirty_rows.add(y)
+
+    def flush(self):
+        """比较后台帧与上一帧，只输出变化的单元格并刷新终端"""
+        self.last_full = self.full_redraw
+        if self.full_redraw:
+            self.stdscr.clear()
+            self.front = [[self.BLANK] * self.width for _ in range(self.height)]
+            self.dirty_rows = set(range(self.height))
+            self.full_redraw = False
+        
+        for y in sorted(self.dirty_rows):
+            new = self.back[y]
+            old = self.front[y]
+            if new == old:
+                continue
+            
+            # 找出变化的单元格区间，相距很近的区间合并输出
+            span_start = -1
+            span_end = -1
+            for x in range(self.width):
+                if new[x] != old[x]:
+                    if span_start < 0:
+                        span_start = x
+                    elif x - span_end > self.MERGE_GAP:
+                        self._write_span(y, span_start, span_end, new)
+                        span_start = x
+                    span_end = x + 1
+            if span_start >= 0:
+                self._write_span(y, span_start, span_end, new)
+            self.front[y] = list(new)
+        
+        self.dirty_rows.clear()
+        self.stdscr.refresh()
+
+    def _write_span(self, y: int, start: int, end: int, row: list):
+        """输出一行中[start, end)范围内的单元格，相同属性的单元格合并为一次写入"""
+        # 不把全角字符拆成两半输出
+        if row[start][0] == WIDE_TAIL and start > 0:
+            start -= 1
+        if end < self.width and row[end][0] == WIDE_TAIL:
+            end += 1
+        
+        seg_x = start
+        seg_attr = row[start][1]
+        seg_chars = []
+        for x in range(start, end):
+            char, attr = row[x]
+            if attr != seg_attr:
+                self._addstr(y, seg_x, "".join(seg_chars), seg_attr)
+                seg_x, seg_attr, seg_chars = x, attr, []
+            seg_chars.append(char)
+        self._addstr(y, seg_x, "".join(seg_chars), seg_attr)
+
+    def _addstr(self, y: int, x: int, text: str, attr: int):
+        try:
+            self.stdscr.addstr(y, x, text, attr)
+        except curses.error:
+            # 写入右下角最后一个单元格时curses会报错，但字符已经显示
+            pass
+
+
+class TypingGame:
+    def __init__(self, stdscr, max_fps: float = 0, stats_hz: float = 4,
+                 passage: Optional[PassageFile] = None,
+                 history: Optional[HistoryStore] = None,
+                 latency: Optional[LatencyMeter] = None,
+                 corpus: Optional[Corpus] = None):
+        self.stdscr = stdscr
+        self.renderer = CellRenderer(stdscr)
+        # 两次绘制之间的最短间隔（秒），0表示每批输入后立即绘制
+        self.frame_interval = 1 / max_fps if max_fps > 0 else 0.0
+        # 计时中没有输入时刷新统计栏的间隔（秒），0表示只在按键时刷新
+        self.stats_interval = 1 / stats_hz if stats_hz > 0 else 0.0
         self.difficulty = "中等"
         self.current_text = ""
-        self.user_input = ""
-        self.start_time = 0
-        self.end_time = 0
-        self.errors = 0
-        self.total_chars = 0
-        self.is_running = False
+        # 长文模式的练习文本（从文件映射），为None时使用内置的短文本
+        self.passage = passage
+        # 外部语料（--corpus），为None时从内置的TEXTS中选取练习文本
+        self.corpus = corpus
+        # 历史成绩库，无法打开时为None
+        self.history = history
+        # 按键到显示的延迟测量（--latency），不测量时为None
+        self.latency = latency
+        self.session = TypingSession()
+        # 输入缓冲和计分器在每局之间复用，这里保存引用方便绘制代码使用
+        self.user_input = self.session.buffer
+        self.score = self.session.score
         
         # 初始化颜色
         curses.start_color()
@@ -156,7 +346,7 @@ class TypingGame:
                 return "quit"
     
     def show_stats(self):
-        """显示统计信息"""
+        """显示历史最佳成绩"""
         self.stdscr.clear()
         h, w = self.stdscr.getmaxyx()
         
@@ -165,86 +355,137 @@ class TypingGame:
         self.stdscr.addstr(2, (w - len(stats_title)) // 2, stats_title)
         self.stdscr.attroff(curses.color_pair(4) | curses.A_BOLD)
         
-        stats_lines = [
-            "",
-            "功能开发中... 敬请期待！",
-            "",
-            "将会包含：",
-            "- 最高WPM记录",
-            "- 最佳准确率",
-            "- 总练习时间",
-            "- 进步曲线",
-            "",
-            "按任意键返回菜单..."
-        ]
+        if self.history is None:
+            stats_lines = ["无法打开历史成绩库"]
+        else:
+            # 等刚结束的一局写入完成（后台线程，通常早已完成）
+            self.history.flush()
+            stats_lines = self.format_stats(self.history.summary())
         
+        stats_lines += ["", "按任意键返回菜单..."]
+        
+        # 统计表格左对齐，整体居中
         start_y = 5
+        block_width = max(text_width(line) for line in stats_lines)
+        x = max(0, (w - block_width) // 2)
         for i, line in enumerate(stats_lines):
-            self.stdscr.addstr(start_y + i, (w - len(line)) // 2, line)
+            if start_y + i >= h - 1:
+                break
+            self.stdscr.addstr(start_y + i, x, line)
         
         self.stdscr.refresh()
         self.stdscr.getch()
     
+    def format_stats(self, summary: dict) -> List[str]:
+        """把历史成绩汇总排成文本行"""
+        totals = summary["totals"]
+        overall = totals.get(ALL)
+        if not overall:
+            return ["还没有练习记录，完成一局后再来看看吧！"]
+        
+        lines = [
+            f"总练习: {overall['sessions']} 局 | 总时间: {format_duration(overall['total_time'])}"
+            f" | 总字符: {overall['total_chars']}",
+            "",
+            pad_to_width("难度", 10) + pad_to_width("局数", 8) + pad_to_width("最高WPM", 10)
+            + pad_to_width("最佳准确率", 12) + "练习时间",
+        ]
+        difficulties = list(TEXTS) + ["长文"]
+        difficulties += sorted(d for d in totals if d != ALL and d not in difficulties)
+        for difficulty in difficulties + [ALL]:
+            t = totals.get(difficulty)
+            if not t:
+                continue
+            lines.append(
+                pad_to_width(difficulty or "全部", 10)
+                + pad_to_width(str(t["sessions"]), 8)
+                + pad_to_width(f"{t['best_wpm']:.1f}", 10)
+                + pad_to_width(f"{t['best_accuracy']:.1f}%", 12)
+                + format_duration(t["total_time"]))
+        
+        curve = summary["curve"]
+        if curve:
+            values = [wpm for _, wpm in curve]
+            lines += [
+                "",
+                f"进步曲线（最近{len(curve)}个练习日的平均WPM）:",
+                f"{sparkline(values)}  {values[0]:.1f} → {values[-1]:.1f} WPM",
+            ]
+        return lines
+    
     def prepare_game(self):
         """准备游戏"""
-        self.current_text = random.choice(TEXTS[self.difficulty])
-        self.user_input = ""
-        self.start_time = 0
-        self.end_time = 0
-        self.errors = 0
-        self.total_chars = 0
-        self.is_running = False
+        if self.passage is not None:
+            self.current_text = self.passage
+        else:
+            self.current_text = self.pick_text()
+        self.session.reset(self.current_text)
+        if self.latency is not None:
+            self.latency.begin_session("长文" if self.passage is not None else self.difficulty)
+    
+    def pick_text(self) -> str:
+        """随机选取当前难度的练习文本：有外部语料时从语料中抽取，语料中没有这个难度时使用内置文本"""
+        if self.corpus is not None:
+            text = self.corpus.sample(self.difficulty)
+            if text:
+                return text
+        return random.choice(TEXTS[self.difficulty])
     
     def draw_game_screen(self):
-        """绘制游戏界面"""
-        self.stdscr.clear()
-        h, w = self.stdscr.getmaxyx()
+        """绘制游戏界面（写入渲染器的后台帧，只有变化的单元格会输出到终端）"""
+        r = self.renderer
+        h, w = r.begin_frame()
         
         # 显示标题和难度
-        title = f"打字练习 - {self.difficulty}难度"
-        self.stdscr.attron(curses.color_pair(4) | curses.A_BOLD)
-        self.stdscr.addstr(1, (w - len(title)) // 2, title)
-        self.stdscr.attroff(curses.color_pair(4) | curses.A_BOLD)
+        if self.passage is not None:
+            title = f"打字练习 - 长文模式: {self.passage.name}"
+        else:
+            title = f"打字练习 - {self.difficulty}难度"
+        r.put(1, (w - text_width(title)) // 2, title, curses.color_pair(4) | curses.A_BOLD)
         
         # 显示提示
         hint = "开始输入即开始计时 | ESC键重新开始"
-        self.stdscr.attron(curses.color_pair(6))
-        self.stdscr.addstr(2, (w - len(hint)) // 2, hint)
-        self.stdscr.attroff(curses.color_pair(6))
+        r.put(2, (w - text_width(hint)) // 2, hint, curses.color_pair(6))
+        
+        if self.passage is not None:
+            self.draw_passage_viewport()
+        else:
+            self.draw_text_area()
+        
+        # 显示实时统计
+        self.draw_stats()
+        
+        r.flush()
+    
+    def draw_text_area(self):
+        """绘制目标文本和用户输入（短文本，整段显示）"""
+        r = self.renderer
+        h, w = r.height, r.width
         
         # 显示目标文本
         target_y = 5
-        self.stdscr.attron(curses.color_pair(3))
-        self.stdscr.addstr(target_y - 1, 3, "目标文本:")
-        self.stdscr.attroff(curses.color_pair(3))
+        r.put(target_y - 1, 3, "目标文本:", curses.color_pair(3))
         
         # 分行显示长文本
         max_width = w - 6
         lines = self.wrap_text(self.current_text, max_width)
         for i, line in enumerate(lines):
-            self.stdscr.addstr(target_y + i, 3, line)
+            r.put(target_y + i, 3, line)
         
         # 显示用户输入（带颜色标记）
         input_y = target_y + len(lines) + 2
-        self.stdscr.attron(curses.color_pair(3))
-        self.stdscr.addstr(input_y - 1, 3, "你的输入:")
-        self.stdscr.attroff(curses.color_pair(3))
+        r.put(input_y - 1, 3, "你的输入:", curses.color_pair(3))
         
         # 逐字符比较并着色
+        correct_attr = curses.color_pair(1)  # 绿色=正确
+        error_attr = curses.color_pair(2)    # 红色=错误
         for i, char in enumerate(self.user_input):
             if i < len(self.current_text):
-                if char == self.current_text[i]:
-                    self.stdscr.attron(curses.color_pair(1))  # 绿色=正确
-                else:
-                    self.stdscr.attron(curses.color_pair(2))  # 红色=错误
-                
                 x = 3 + (i % max_width)
                 y = input_y + (i // max_width)
                 if y < h - 8:  # 确保不超出屏幕
-                    self.stdscr.addstr(y, x, char)
-                
-                self.stdscr.attroff(curses.color_pair(1))
-                self.stdscr.attroff(curses.color_pair(2))
+                    attr = correct_attr if self.score.is_correct(i) else error_attr
+                    r.put(y, x, char, attr)
         
         # 显示光标位置（下划线）
         if len(self.user_input) < len(self.current_text):
@@ -252,69 +493,100 @@ class TypingGame:
             x = 3 + (cursor_pos % max_width)
             y = input_y + (cursor_pos // max_width)
             if y < h - 8:
-                self.stdscr.attron(curses.A_UNDERLINE | curses.color_pair(3))
-                self.stdscr.addstr(y, x, "_")
-                self.stdscr.attroff(curses.A_UNDERLINE | curses.color_pair(3))
-        
-        # 显示实时统计
+                r.put(y, x, "_", curses.A_UNDERLINE | curses.color_pair(3))
+    
+    def draw_passage_viewport(self):
+        """
+        绘制长文模式的滚动视口
+        文本按屏幕宽度切成定长的行，每行目标文本下方紧跟对应的输入，
+        只绘制光标附近能放下的几行，每次按键的绘制量与文本总长度无关
+        """
+        r = self.renderer
+        h, w = r.height, r.width
+        line_width = w - 6
+        if line_width <= 0:
+            return
+        
+        text = self.current_text
+        total = len(text)
+        pos = len(self.user_input)
+        total_lines = (total + line_width - 1) // line_width
+        cursor_line = min(pos // line_width, total_lines - 1)
+        
+        # 每行占3个屏幕行：目标文本、输入、空行；光标所在行保持在视口第二行
+        top_y = 5
+        visible = max(1, (h - 8 - top_y) // 3)
+        first = max(0, min(cursor_line - 1, total_lines - visible))
+        
+        r.put(top_y - 1, 3, f"目标文本 / 你的输入:  第 {cursor_line + 1}/{total_lines} 行",
+              curses.color_pair(3))
+        
+        correct_attr = curses.color_pair(1)
+        error_attr = curses.color_pair(2)
+        marks = self.score.marks
+        for n in range(first, min(first + visible, total_lines)):
+            y = top_y + (n - first) * 3
+            start = n * line_width
+            end = min(start + line_width, total)
+            r.put(y, 3, text[start:end])
+            
+            # 输入中连续的正确/错误字符合并成一段写入
+            typed_end = min(end, pos)
+            i = start
+            while i < typed_end:
+                ok = marks[i]
+                j = i + 1
+                while j < typed_end and marks[j] == ok:
+                    j += 1
+                r.put(y + 1, 3 + i - start, self.user_input.text(i, j),
+                      correct_attr if ok else error_attr)
+                i = j
+            
+            if start <= pos < end:
+                r.put(y + 1, 3 + pos - start, "_", curses.A_UNDERLINE | curses.color_pair(3))
+    
+    def draw_stats(self):
+        """绘制底部的实时统计栏（写入渲染器的后台帧）"""
+        r = self.renderer
+        h, w = r.height, r.width
         stats_y = h - 6
-        self.stdscr.attron(curses.color_pair(5))
-        self.stdscr.addstr(stats_y, 3, "=" * (w - 6))
+        stats_attr = curses.color_pair(5)
+        r.put(stats_y, 3, "=" * (w - 6), stats_attr)
         
         progress = len(self.user_input) / len(self.current_text) * 100
         accuracy = self.calculate_accuracy()
         wpm = self.calculate_wpm()
         
         stats_line1 = f"进度: {progress:.1f}% | 准确率: {accuracy:.1f}% | 速度: {wpm:.1f} WPM"
-        self.stdscr.addstr(stats_y + 1, 3, stats_line1)
+        r.put(stats_y + 1, 3, stats_line1, stats_attr)
         
         # 进度条
         bar_width = w - 10
         filled = int(bar_width * progress / 100)
         progress_bar = "█" * filled + "░" * (bar_width - filled)
-        self.stdscr.addstr(stats_y + 2, 5, progress_bar)
-        
-        self.stdscr.attroff(curses.color_pair(5))
-        
-        self.stdscr.refresh()
+        r.put(stats_y + 2, 5, progress_bar, stats_attr)
+    
+    def refresh_stats(self):
+        """只重绘统计栏（停顿时定时刷新WPM），屏幕其他部分不动"""
+        h = self.renderer.height
+        if not self.renderer.clear_rows(h - 6, h - 3):
+            self.draw_game_screen()
+            return
+        self.draw_stats()
+        self.renderer.flush()
     
-    def wrap_text(self, text: str, max_width: int) -> List[str]:
+    def wrap_text(self, text: str, max_width: int) -> Tuple[str, ...]:
         """将文本按宽度分行"""
-        lines = []
-        current_line = ""
-        for word in text.split():
-            if len(current_line) + len(word) + 1 <= max_width:
-                current_line += word + " "
-            else:
-                if current_line:
-                    lines.append(current_line.rstrip())
-                current_line = word + " "
-        if current_line:
-            lines.append(current_line.rstrip())
-        return lines if lines else [text[:max_width]]
+        return wrap_lines(text, max_width)
     
     def calculate_accuracy(self) -> float:
         """计算准确率"""
-        if len(self.user_input) == 0:
-            return 100.0
-        
-        correct = sum(1 for i, char in enumerate(self.user_input) 
-                     if i < len(self.current_text) and char == self.current_text[i])
-        return (correct / len(self.user_input)) * 100
+        return self.score.accuracy()
     
     def calculate_wpm(self) -> float:
         """计算每分钟单词数（WPM）"""
-        if not self.is_running or self.start_time == 0:
-            return 0.0
-        
-        elapsed_time = time.time() - self.start_time
-        if elapsed_time == 0:
-            return 0.0
-        
         # WPM = (字符数 / 5) / 分钟数
-        minutes = elapsed_time / 60
-        words = len(self.user_input) / 5
-        return words / minutes if minutes > 0 else 0.0
+        return self.session.wpm(time.perf_counter_ns())
     
     def show_results(self):
         """显示最终结果"""
@@ -322,7 +594,7 @@ class TypingGame:
         h, w = self.stdscr.getmaxyx()
         
         # 计算最终统计
-        elapsed_time = self.end_time - self.start_time
+        elapsed_time = self.session.elapsed()
         wpm = self.calculate_wpm()
         accuracy = self.calculate_accuracy()
         
@@ -352,7 +624,7 @@ class TypingGame:
             f"速度: {wpm:.1f} WPM",
             f"准确率: {accuracy:.1f}%",
             f"总字符数: {len(self.user_input)}",
-            f"错误数: {self.total_chars - sum(1 for i, c in enumerate(self.user_input) if i < len(self.current_text) and c == self.current_text[i])}",
+            f"错误数: {self.score.errors}",
             "",
         ]
         
@@ -391,52 +663,129 @@ class TypingGame:
             elif key in [ord('q'), ord('Q')]:
                 return "quit"
     
+    def read_keys(self) -> List[int]:
+        """
+        读取一批按键
+        按当前的超时设置等待第一个键，然后非阻塞地取完队列中已有的所有键，
+        快速连打或粘贴时一次处理完再绘制，输入处理不会排在屏幕输出后面
+        """
+        key = self.stdscr.getch()
+        if key == -1:
+            return []
+        keys = [key]
+        self.stdscr.nodelay(True)
+        try:
+            key = self.stdscr.getch()
+            while key != -1:
+                keys.append(key)
+                key = self.stdscr.getch()
+        finally:
+            self.stdscr.nodelay(False)
+        return keys
+    
+    def handle_key(self, key: int) -> Optional[str]:
+        """
+        处理游戏中的一个按键
+        返回"restart"/"finished"表示本局结束，"changed"表示需要重绘，None表示无变化
+        """
+        # ESC键重新开始
+        if key == 27:
+            return "restart"
+        
+        # 窗口大小变化（渲染器检测到尺寸变化后会整屏重绘）
+        elif key == curses.KEY_RESIZE:
+            return "changed"
+        
+        # 退格键
+        elif key in [curses.KEY_BACKSPACE, 127, 8]:
+            now = time.perf_counter_ns()
+            if self.session.backspace(now):
+                if self.latency is not None:
+                    self.latency.key(now)
+                return "changed"
+        
+        # 普通字符输入（第一次输入时开始计时）
+        elif 32 <= key <= 126:
+            now = time.perf_counter_ns()
+            self.session.type_char(chr(key), now)
+            if self.latency is not None:
+                self.latency.key(now)
+            return "finished" if self.session.finished else "changed"
+        
+        return None
+    
+    def record_result(self):
+        """把完成的一局保存到历史成绩库"""
+        if self.history is not None:
+            difficulty = "长文" if self.passage is not None else self.difficulty
+            self.history.record(self.session, difficulty, "terminal")
+    
+    def render_path(self) -> str:
+        """上一次刷新的渲染路径（终端后端/整屏或差分），用于分别统计延迟"""
+        backend = "ansi" if curses.__name__ == "typing_ansi" else "curses"
+        return f"{backend}/{'full' if self.renderer.last_full else 'diff'}"
+    
     def play(self):
         """游戏主循环"""
         self.prepare_game()
+        # 菜单/结果界面直接清屏绘制过，第一帧需要整屏重绘
+        self.renderer.invalidate()
         self.draw_game_screen()
+        last_render = last_stats = time.perf_counter()
+        pending = False  # 是否有尚未绘制的输入
         
         while True:
-            key = self.stdscr.getch()
+            # 有待绘制的输入但受帧率限制时，最多等到下一次允许绘制的时刻；
+            # 计时中最多等到下一次刷新统计栏的时刻；否则一直阻塞等待按键（空闲时不占CPU）
+            deadline = None
+            if pending:
+                deadline = last_render + self.frame_interval
+            elif self.stats_interval and self.session.is_running:
+                deadline = last_stats + self.stats_interval
+            if deadline is None:
+                self.stdscr.timeout(-1)
+            else:
+                wait = deadline - time.perf_counter()
+                self.stdscr.timeout(max(0, int(wait * 1000)))
             
-            # ESC键重新开始
-            if key == 27:
-                return "restart"
+            for key in self.read_keys():
+                result = self.handle_key(key)
+                if result == "restart":
+                    return "restart"
+                elif result == "finished":
+                    # 丢弃完成后多余的输入（例如粘贴的文本），以免被结果界面当成选项
+                    curses.flushinp()
+                    # 保存成绩和按键记录（后台写入）
+                    self.record_result()
+                    return self.show_results()
+                elif result == "changed":
+                    pending = True
             
-            # 退格键
-            elif key in [curses.KEY_BACKSPACE, 127, 8]:
-                if len(self.user_input) > 0:
-                    self.user_input = self.user_input[:-1]
+            # 一批按键处理完后只绘制一次
+            now = time.perf_counter()
+            if pending:
+                if now - last_render >= self.frame_interval:
                     self.draw_game_screen()
-            
-            # 普通字符输入
-            elif 32 <= key <= 126:
-                # 第一次输入时开始计时
-                if not self.is_running:
-                    self.start_time = time.time()
-                    self.is_running = True
-                
-                char = chr(key)
-                self.user_input += char
-                self.total_chars += 1
-                
-                # 检查是否完成
-                if len(self.user_input) >= len(self.current_text):
-                    self.end_time = time.time()
-                    return self.show_results()
-                
-                self.draw_game_screen()
+                    if self.latency is not None:
+                        self.latency.frame(self.render_path(), time.perf_counter_ns())
+                    last_render = last_stats = now
+                    pending = False
+            elif self.stats_interval and self.session.is_running:
+                if now - last_stats >= self.stats_interval:
+                    self.refresh_stats()
+                    last_stats = now
     
     def run(self):
         """运行游戏"""
         while True:
-            # 显示菜单
-            choice = self.show_menu()
-            
-            if choice == "quit":
-                break
-            
-            self.difficulty = choice
+            # 显示菜单（长文模式直接开始练习）
+            if self.passage is None:
+                choice = self.show_menu()
+                
+                if choice == "quit":
+                    break
+                
+                self.difficulty = choice
             
             # 游戏循环
             while True:
@@ -446,20 +795,69 @@ class TypingGame:
                     self.prepare_game()
                     continue
                 elif result == "menu":
+                    # 从长文模式返回菜单后改用内置文本
+                    self.passage = None
                     break
                 elif result == "quit":
                     return
 
 
-def main(stdscr):
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="互动打字练习游戏 - 终端版")
+    parser.add_argument("--max-fps", type=float, default=0,
+                        help="游戏界面的最高绘制帧率，0表示不限制（慢速终端/SSH下可调低）")
+    parser.add_argument("--stats-hz", type=float, default=4,
+                        help="停顿时统计栏（WPM）的刷新频率，0表示只在按键时刷新")
+    parser.add_argument("--file", metavar="PATH",
+                        help="长文模式：练习指定文本文件的全部内容（任意大小，滚动显示）")
+    parser.add_argument("--corpus", metavar="PATH",
+                        help="从指定的文本语料（任意大小）中随机抽取练习句子，第一次使用时建立索引")
+    parser.add_argument("--ansi", action="store_true",
+                        help="不使用curses，改用内置的纯ANSI终端后端")
+    parser.add_argument("--latency", action="store_true",
+                        help="测量按键到显示的延迟，退出时打印每局和各渲染路径的延迟分布并保存为JSON")
+    return parser.parse_args(argv)
+
+
+def main(stdscr, args, passage=None, history=None, latency=None, corpus=None):
     """主函数"""
-    game = TypingGame(stdscr)
+    game = TypingGame(stdscr, max_fps=args.max_fps, stats_hz=args.stats_hz,
+                      passage=passage, history=history, latency=latency, corpus=corpus)
     game.run()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.ansi:
+        import typing_ansi as curses
+    passage = None
+    if args.file:
+        try:
+            passage = PassageFile(args.file)
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法打开练习文本: {e}")
+            sys.exit(1)
+    corpus = None
+    if args.corpus:
+        try:
+            corpus = Corpus(args.corpus, on_build=lambda p: print(f"正在为语料建立索引（只需一次）: {p}"))
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法打开语料: {e}")
+            sys.exit(1)
+    history = open_history()
+    latency = LatencyMeter("terminal") if args.latency else None
     try:
-        curses.wrapper(main)
+        curses.wrapper(main, args, passage, history, latency, corpus)
     except KeyboardInterrupt:
         print("\n感谢游玩！再见！")
+    finally:
+        if history is not None:
+            history.close()
+        if latency is not None:
+            print(latency.report())
+            try:
+                print(f"延迟数据已保存到 {latency.save()}")
+            except OSError as e:
+                print(f"无法保存延迟数据: {e}")
 
@@ -6,27 +6,72 @@
 支持中文显示
 """
 
-import pygame
 import time
+
+# 启动计时的起点（--profile-startup），放在其他导入之前以便统计导入耗时
+STARTUP_T0 = time.perf_counter()
+
+import argparse
+import csv
+import pygame
+import json
 import random
 import sys
 import os
+import operator
+import re
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import accumulate
 from typing import List, Tuple
 
-# 初始化pygame
-pygame.init()
+from typing_core import DATA_DIR, LatencyMeter, TypingSession, is_typable, percentile
+from typing_corpus import Corpus
+from typing_history import open_history
+from typing_passage import PassageFile
 
-# 获取支持中文的字体
-def get_chinese_font(size):
+STARTUP_IMPORTED = time.perf_counter()
+
+
+def init_pygame():
+    """只初始化用到的显示和字体子系统（音频、手柄等用不到，不初始化）"""
+    pygame.display.init()
+    pygame.font.init()
+
+
+class StartupProfile:
+    """启动耗时记录：依次记录各阶段完成的时刻，首帧显示后打印报告"""
+    
+    def __init__(self, t0=STARTUP_T0):
+        self.t0 = t0
+        self.marks = []
+    
+    def mark(self, name, t=None):
+        """记录一个阶段完成"""
+        self.marks.append((name, time.perf_counter() if t is None else t))
+    
+    def report(self):
+        """各阶段耗时和累计耗时（毫秒）"""
+        lines = ["启动耗时:"]
+        prev = self.t0
+        for name, t in self.marks:
+            lines.append(f"  {(t - prev) * 1000:8.1f} ms  累计 {(t - self.t0) * 1000:8.1f} ms  {name}")
+            prev = t
+        return "\n".join(lines)
+
+# 字体查找结果的缓存文件
+FONT_CACHE_PATH = os.path.join(DATA_DIR, "font_cache.json")
+
+
+def chinese_font_candidates():
     """
-    获取支持中文的字体
-    按优先级尝试不同的中文字体
+    常见中文字体列表（按系统分类，按优先级排列）
+    可以是字体名称，也可以是字体文件的完整路径
     """
-    # 常见中文字体列表（按系统分类）
-    chinese_fonts = []
-    
     if sys.platform == 'win32':  # Windows
-        chinese_fonts = [
+        return [
             'microsoftyahei',  # 微软雅黑
             'simsun',          # 宋体
             'simhei',          # 黑体
@@ -35,37 +80,124 @@ def get_chinese_font(size):
             'C:\\Windows\\Fonts\\simhei.ttf', # 黑体完整路径
         ]
     elif sys.platform == 'darwin':  # macOS
-        chinese_fonts = [
+        return [
             'PingFang SC',
             'Heiti SC',
             'STHeiti',
             'Arial Unicode MS',
         ]
     else:  # Linux
-        chinese_fonts = [
+        return [
             'WenQuanYi Micro Hei',
             'WenQuanYi Zen Hei',
             'Droid Sans Fallback',
             'Noto Sans CJK SC',
             'DejaVu Sans',
         ]
-    
-    # 尝试加载字体
-    for font_name in chinese_fonts:
+
+
+def font_dirs():
+    """系统和用户的字体目录"""
+    if sys.platform == 'win32':
+        return [
+            os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts'),
+        ]
+    elif sys.platform == 'darwin':
+        return ['/System/Library/Fonts', '/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
+    else:
+        return ['/usr/share/fonts', '/usr/local/share/fonts',
+                os.path.expanduser('~/.fonts'), os.path.expanduser('~/.local/share/fonts')]
+
+
+def font_dirs_mtime():
+    """字体目录（及其下一级子目录）的最新修改时间，安装或删除字体后会变化"""
+    latest = 0.0
+    for path in font_dirs():
+        try:
+            latest = max(latest, os.stat(path).st_mtime)
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        latest = max(latest, entry.stat().st_mtime)
+        except OSError:
+            continue
+    return latest
+
+
+def search_chinese_font():
+    """
+    按优先级查找支持中文的字体文件，返回路径（都找不到时返回None）
+    需要扫描系统字体目录，比较慢，结果由find_chinese_font()缓存
+    """
+    fallback = None
+    for font_name in chinese_font_candidates():
+        path = font_name if os.path.isfile(font_name) else pygame.font.match_font(font_name)
+        if not path:
+            continue
         try:
-            font = pygame.font.SysFont(font_name, size)
-            # 测试是否支持中文
-            test_surface = font.render('测试', True, (255, 255, 255))
-            if test_surface.get_width() > 0:
-                return font
-        except:
+            font = pygame.font.Font(path, FONT_SIZES['small'])
+        except (OSError, pygame.error):
             continue
+        # 测试是否包含中文字形；都不包含时使用第一个能加载的字体
+        if None not in font.metrics('测试'):
+            return path
+        if fallback is None:
+            fallback = path
+    return fallback
+
+
+def find_chinese_font():
+    """
+    支持中文的字体文件路径
+    查找结果保存在FONT_CACHE_PATH中，字体目录没有变化时直接使用，不再扫描系统字体
+    """
+    mtime = font_dirs_mtime()
+    try:
+        with open(FONT_CACHE_PATH, encoding="utf-8") as f:
+            cached = json.load(f)
+        if (cached["platform"] == sys.platform and cached["mtime"] == mtime
+                and (cached["path"] is None or os.path.isfile(cached["path"]))):
+            return cached["path"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
     
-    # 如果都失败，返回默认字体（可能不支持中文）
+    path = search_chinese_font()
     try:
-        return pygame.font.Font(None, size)
-    except:
-        return pygame.font.SysFont('arial', size)
+        os.makedirs(DATA_DIR, exist_ok=True)
+        with open(FONT_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"platform": sys.platform, "mtime": mtime, "path": path}, f)
+    except OSError:
+        pass
+    return path
+
+
+# 获取支持中文的字体
+def get_chinese_font(size, path=None):
+    """
+    获取支持中文的字体
+    path为字体文件路径（默认由find_chinese_font()查找），无法加载时使用默认字体（可能不支持中文）
+    """
+    if path is None:
+        path = find_chinese_font()
+    if path is not None:
+        try:
+            return pygame.font.Font(path, size)
+        except (OSError, pygame.error):
+            pass
+    return pygame.font.Font(None, size)
+
+
+class FontSet(dict):
+    """按用途（FONT_SIZES中的名称）取字体，每种大小在第一次使用时才创建"""
+    
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+    
+    def __missing__(self, name):
+        font = self[name] = get_chinese_font(FONT_SIZES[name], self.path)
+        return font
 
 # 颜色定义
 COLORS = {
@@ -83,6 +215,10 @@ COLORS = {
 WINDOW_WIDTH = 1000
 WINDOW_HEIGHT = 700
 FPS = 60
+# 没有动画时的最低刷新频率（空闲时阻塞等待事件，最多等待1/IDLE_HZ秒）
+IDLE_HZ = 2
+# 不支持阻塞等待事件的视频驱动（SDL会每毫秒轮询一次，还不如按FPS轮询）
+POLLING_DRIVERS = {"dummy", "offscreen"}
 
 # 字体大小
 FONT_SIZES = {
@@ -129,6 +265,487 @@ TEXTS = {
 }
 
 
+class GlyphCache:
+    """
+    字形缓存
+    以(字体, 字符, 颜色)为键缓存渲染好的字符Surface（也可以缓存整段短文字），超过容量时淘汰最久未使用的；
+    同时缓存每个字符的宽度，逐字排版时不需要再渲染或测量
+    """
+    def __init__(self, capacity=2048):
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.advances = {}
+        self.renders = 0  # 实际调用font.render的次数（缓存未命中）
+    
+    def get(self, font, char, color):
+        """取得字符的Surface"""
+        key = (font, char, color)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+        
+        surf = font.render(char, True, color)
+        self.renders += 1
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surf
+    
+    def advance(self, font, char):
+        """字符的宽度（像素）"""
+        key = (font, char)
+        width = self.advances.get(key)
+        if width is None:
+            width = font.size(char)[0]
+            self.advances[key] = width
+        return width
+    
+    def clear(self):
+        """清空缓存（更换字体后调用）"""
+        self.surfaces.clear()
+        self.advances.clear()
+
+
+class TextLayout:
+    """
+    一段文本按宽度自动换行后的排版结果
+    保存每行渲染好的Surface，以及原文中每个字符左上角相对于文本起点的位置，
+    绘制、光标定位和输入着色都直接使用，不需要重新测量和渲染
+    """
+    def __init__(self, text, font, max_width, color, line_height=35):
+        self.text = text
+        self.line_height = line_height
+        
+        # 按单词换行，记录每个单词在原文中的起点、所在行和行内的列
+        lines = []
+        placed = []
+        current_line = ""
+        for match in re.finditer(r"\S+", text):
+            word = match.group()
+            test_line = current_line + word + " "
+            if font.size(test_line)[0] <= max_width:
+                placed.append((match.start(), match.end(), len(lines), len(current_line)))
+                current_line = test_line
+            else:
+                if current_line:
+                    lines.append(current_line)
+                placed.append((match.start(), match.end(), len(lines), 0))
+                current_line = word + " "
+        if current_line:
+            lines.append(current_line)
+        
+        self.lines = lines
+        self.surfaces = [font.render(line, True, color) for line in lines]
+        
+        # 每行中各列的x坐标（行首为0，逐字累加字符宽度）
+        columns = []
+        for line in lines:
+            advances = [m[4] if m else font.size(char)[0]
+                        for char, m in zip(line, font.metrics(line))]
+            columns.append(list(accumulate(advances, initial=0)))
+        
+        # 每个字符的位置；单词之间的空白都位于前一个单词的末尾。多出的一项是文本末尾（光标）的位置
+        n = len(text)
+        self.xs = array("i", [0]) * (n + 1)
+        self.ys = array("i", [0]) * (n + 1)
+        xs, ys = self.xs, self.ys
+        x = y = 0
+        end = 0
+        for start, stop, line, col in placed:
+            for i in range(end, start):
+                xs[i] = x
+                ys[i] = y
+            y = line * line_height
+            offsets = columns[line]
+            for i in range(start, stop):
+                xs[i] = offsets[col + i - start]
+                ys[i] = y
+            x = offsets[col + stop - start]
+            end = stop
+        for i in range(end, n + 1):
+            xs[i] = x
+            ys[i] = y
+    
+    def position(self, index):
+        """第index个字符左上角的位置（index为文本长度时是文本末尾）"""
+        return self.xs[index], self.ys[index]
+    
+    def blits(self, x, y):
+        """把所有行画到(x, y)处的blit参数列表"""
+        line_height = self.line_height
+        return [(surf, (x, y + i * line_height)) for i, surf in enumerate(self.surfaces)]
+
+
+@lru_cache(maxsize=32)
+def layout_text(text, font, max_width, color):
+    """文本的排版结果，按(文本, 字体, 宽度, 颜色)缓存"""
+    return TextLayout(text, font, max_width, color)
+
+
+class PassageView:
+    """
+    长文模式的虚拟化视口
+    目标文本按像素宽度分行（按单词换行，字符宽度取自字形缓存），每行的起点保存在行索引中；
+    行索引随光标前进分块延伸，打开任意大小的文件都不需要先处理全文。
+    输入按同样的行和列对齐显示在每行目标文本的下方，每帧只绘制视口中可见的几行，
+    视口平滑地跟随光标滚动，绘制量与文本总长度无关。
+    文本中的字符都是可打印ASCII（PassageFile保证这一点）
+    """
+    INDEX_CHUNK = 16384  # 每次延伸行索引时处理的字符数
+    PADDING = 16         # 文本与视口边框的距离
+    ROW_GAP = 16         # 相邻两行（目标文本+输入）之间的空隙，不小于PADDING时静止的视口中不会露出半行
+    CURSOR_ROW = 1       # 光标所在的行保持在视口中的第几行（从0开始）
+    SCROLL_SPEED = 0.25  # 每帧滚动剩余距离的比例
+    LINE_CACHE = 32      # 缓存的目标文本行Surface数
+    
+    def __init__(self, text, glyphs, font, rect):
+        self.text = text
+        self.length = len(text)
+        self.glyphs = glyphs
+        self.font = font
+        self.rect = pygame.Rect(rect)
+        self.max_width = self.rect.width - self.PADDING * 2
+        self.line_height = font.get_linesize() + 2
+        self.pitch = self.line_height * 2 + self.ROW_GAP
+        self.widths = [glyphs.advance(font, chr(c)) for c in range(128)]
+        
+        self.starts = array("q", [0])  # 每行第一个字符的位置
+        self.indexed = 0               # 行索引已经处理到的位置
+        self.line_x = 0                # 最后一行已处理部分的宽度
+        self.break_pos = 0             # 最后一行中最近的换行点（空格之后的位置）
+        self.break_x = 0               # 行首到换行点的宽度
+        
+        self.scroll = 0.0              # 视口顶部的y坐标（相对于第一行）
+        self.target_scroll = 0
+        self.line_surfaces = OrderedDict()  # (行号, 颜色) -> 目标文本行的Surface
+    
+    def extend_index(self):
+        """把行索引再延伸INDEX_CHUNK个字符，全文都已处理时返回False"""
+        start = self.indexed
+        if start >= self.length:
+            return False
+        end = min(start + self.INDEX_CHUNK, self.length)
+        starts = self.starts
+        widths = self.widths
+        max_width = self.max_width
+        x, break_pos, break_x = self.line_x, self.break_pos, self.break_x
+        for i, char in enumerate(self.text[start:end], start):
+            width = widths[ord(char)]
+            if char == " ":
+                # 行尾的空格可以超出宽度，换行点在空格之后
+                x += width
+                break_pos, break_x = i + 1, x
+                continue
+            if x + width > max_width and i > starts[-1]:
+                if break_pos > starts[-1]:
+                    # 在最近的单词边界换行，当前单词移到下一行
+                    starts.append(break_pos)
+                    x -= break_x
+                else:
+                    # 单词比整行还长，只能从中间断开
+                    starts.append(i)
+                    x = 0
+            x += width
+        self.indexed = end
+        self.line_x, self.break_pos, self.break_x = x, break_pos, break_x
+        return True
+    
+    def line_of(self, pos):
+        """第pos个字符（pos为文本长度时是文本末尾）所在的行号"""
+        while self.indexed <= pos and self.extend_index():
+            pass
+        return bisect_right(self.starts, pos) - 1
+    
+    def line_range(self, line):
+        """第line行在文本中的范围[start, end)，超出文本时返回None"""
+        starts = self.starts
+        while len(starts) <= line + 1 and self.extend_index():
+            pass
+        if line >= len(starts):
+            return None
+        end = starts[line + 1] if line + 1 < len(starts) else self.length
+        return starts[line], end
+    
+    def line_count(self):
+        """总行数，行索引还没有覆盖全文时为None"""
+        return len(self.starts) if self.indexed >= self.length else None
+    
+    def line_surface(self, line, start, end, color):
+        """
+        目标文本一行的Surface，由逐个字符的字形拼成，与按字符宽度排列的输入严格对齐
+        （整行渲染时字距与逐字累加的宽度不完全相同）
+        """
+        key = (line, color)
+        surf = self.line_surfaces.get(key)
+        if surf is not None:
+            self.line_surfaces.move_to_end(key)
+            return surf
+        
+        text = self.text[start:end]
+        widths = self.widths
+        glyph = self.glyphs.get
+        surf = pygame.Surface((max(1, sum(widths[ord(char)] for char in text)), self.line_height),
+                              pygame.SRCALPHA)
+        x = 0
+        blits = []
+        for char in text:
+            blits.append((glyph(self.font, char, color), (x, 0)))
+            x += widths[ord(char)]
+        surf.blits(blits, doreturn=False)
+        self.line_surfaces[key] = surf
+        if len(self.line_surfaces) > self.LINE_CACHE:
+            self.line_surfaces.popitem(last=False)
+        return surf
+    
+    def update(self, pos):
+        """每帧调用：让视口向光标所在的位置滚动一步"""
+        self.target_scroll = max(0, self.line_of(pos) - self.CURSOR_ROW) * self.pitch
+        distance = self.target_scroll - self.scroll
+        if abs(distance) < 0.5:
+            self.scroll = float(self.target_scroll)
+        else:
+            self.scroll += distance * self.SCROLL_SPEED
+    
+    @property
+    def scrolling(self):
+        """是否还在滚动（滚动时需要按FPS连续绘制）"""
+        return self.scroll != self.target_scroll
+    
+    def draw(self, screen, buffer, marks, text_color, correct_color, error_color,
+             cursor_color=None):
+        """只绘制视口中可见的各行目标文本和对应的输入，cursor_color为None时不画光标"""
+        rect = self.rect
+        pos = len(marks)
+        glyph = self.glyphs.get
+        font = self.font
+        widths = self.widths
+        scroll = int(self.scroll)
+        first = max(0, (scroll - self.PADDING) // self.pitch)
+        rows = rect.height // self.pitch + 2
+        left = rect.x + self.PADDING
+        
+        blits = []
+        for line in range(first, first + rows):
+            span = self.line_range(line)
+            if span is None:
+                break
+            start, end = span
+            y = rect.y + self.PADDING + line * self.pitch - scroll
+            blits.append((self.line_surface(line, start, end, text_color), (left, y)))
+            
+            # 输入中的每个字符画在对应目标字符的正下方
+            typed_end = min(end, pos)
+            x = left
+            y += self.line_height
+            if start < typed_end:
+                typed = buffer.text(start, typed_end)
+                for char, target_char, ok in zip(typed, self.text[start:typed_end],
+                                                 marks[start:typed_end]):
+                    blits.append((glyph(font, char, correct_color if ok else error_color), (x, y)))
+                    x += widths[ord(target_char)]
+            if cursor_color is not None and start <= pos < end:
+                blits.append((glyph(font, "_", cursor_color), (x, y)))
+        
+        # 只画在视口之内（与脏矩形的裁剪区域取交集）
+        clip = screen.get_clip()
+        screen.set_clip(rect.inflate(-4, -4).clip(clip))
+        screen.blits(blits, doreturn=False)
+        screen.set_clip(clip)
+
+
+class DirtyRegions:
+    """
+    脏矩形跟踪
+    每帧比较各区域内容的签名，只重绘并提交发生变化的矩形区域；
+    没有任何变化时整帧跳过，既不绘制也不调用display.update
+    """
+    def __init__(self):
+        self.rects = []
+        self.full = True
+        self.signatures = {}
+    
+    def invalidate(self):
+        """下一帧整屏重绘（切换界面、窗口重新显示时）"""
+        self.full = True
+        self.signatures.clear()
+    
+    def mark(self, rect):
+        """把一个区域标记为需要重绘"""
+        if rect:
+            self.rects.append(pygame.Rect(rect))
+    
+    def check(self, name, signature, rect):
+        """区域内容的签名与上一帧不同时标记该区域"""
+        if self.signatures.get(name) != signature:
+            self.signatures[name] = signature
+            self.mark(rect)
+    
+    def has_changes(self):
+        """本帧是否需要绘制"""
+        return self.full or bool(self.rects)
+    
+    def present(self, screen, draw):
+        """只在变化区域内重绘，并只把这些区域提交到显示"""
+        if self.full:
+            draw()
+            pygame.display.flip()
+        else:
+            screen.set_clip(self.rects[0].unionall(self.rects[1:]))
+            draw()
+            screen.set_clip(None)
+            pygame.display.update(self.rects)
+        self.full = False
+        self.rects = []
+
+
+class FrameProfiler:
+    """
+    主循环的分阶段耗时记录（F3开关，F4导出CSV）
+    启用时用实例属性给游戏的各阶段方法套上计时包装，关闭时删除这些属性，
+    因此关闭状态下主循环里没有任何计时代码。每帧各阶段的耗时（纳秒）存放在环形缓冲区中，
+    同时在屏幕左下角显示帧耗时的分位数、粒子数和每帧的字形渲染次数
+    """
+    CAPACITY = 600  # 保留最近的帧数（60FPS下约10秒）
+    # 粒子更新、绘制界面（不含统计栏）、统计栏、提交显示、事件处理、等待（空闲或FPS限速）
+    PHASES = ("particles", "screen", "stats", "present", "events", "wait")
+    PHASE_NAMES = ("粒子", "界面", "统计", "提交", "事件")
+    OVERLAY_RECT = pygame.Rect(10, WINDOW_HEIGHT - 100, 420, 92)
+    OVERLAY_INTERVAL = 0.25  # 叠加层的刷新间隔（秒）
+    
+    def __init__(self, game):
+        self.game = game
+        self.phases = {name: array("q", [0]) * self.CAPACITY for name in self.PHASES}
+        self.start_ns = array("q", [0]) * self.CAPACITY
+        self.particles = array("q", [0]) * self.CAPACITY
+        self.renders = array("q", [0]) * self.CAPACITY
+        self.count = 0  # 已记录的总帧数
+        self.current = dict.fromkeys(self.PHASES, 0)
+        self.frame_start = time.perf_counter_ns()
+        self.renders_total = self.glyph_renders()
+        self.overlay = []
+        self.overlay_time = 0.0
+    
+    def glyph_renders(self):
+        """字形缓存累计的渲染次数"""
+        return self.game.glyphs.renders + self.game.stat_surfaces.renders
+    
+    def _timed(self, phase, func):
+        current = self.current
+        clock = time.perf_counter_ns
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                current[phase] += clock() - t0
+        return timed
+    
+    def attach(self):
+        """开始计时：给各阶段的方法套上计时包装"""
+        game = self.game
+        game.update_particles = self._timed("particles", game.update_particles)
+        game.draw_stats = self._timed("stats", game.draw_stats)
+        game.wait_events = self._timed("wait", game.wait_events)
+        game.dirty.present = self._timed("present", game.dirty.present)
+        
+        draw_screen = self._timed("screen", game.draw_current_screen)
+        def draw_current_screen():
+            draw_screen()
+            self.draw_overlay(game.screen)
+        game.draw_current_screen = draw_current_screen
+        
+        find_dirty_regions = game.find_dirty_regions
+        def find_dirty_regions_with_overlay():
+            find_dirty_regions()
+            if time.perf_counter() - self.overlay_time >= self.OVERLAY_INTERVAL:
+                self.update_overlay()
+                game.dirty.mark(self.OVERLAY_RECT)
+        game.find_dirty_regions = find_dirty_regions_with_overlay
+        
+        handle_events = self._timed("events", game.handle_events)
+        def handle_events_and_end_frame(events):
+            try:
+                return handle_events(events)
+            finally:
+                self.end_frame()
+        game.handle_events = handle_events_and_end_frame
+    
+    def detach(self):
+        """停止计时：删除计时包装，恢复原来的方法"""
+        game = self.game
+        for name in ("update_particles", "draw_stats", "wait_events", "draw_current_screen",
+                     "find_dirty_regions", "handle_events"):
+            game.__dict__.pop(name, None)
+        game.dirty.__dict__.pop("present", None)
+        game.dirty.invalidate()  # 去掉屏幕上的叠加层
+    
+    def end_frame(self):
+        """一帧结束：把各阶段的耗时写入环形缓冲区"""
+        current = self.current
+        # 提交显示的计时包含了绘制，绘制界面的计时包含了统计栏
+        current["present"] -= current["screen"]
+        current["screen"] -= current["stats"]
+        
+        i = self.count % self.CAPACITY
+        for name in self.PHASES:
+            self.phases[name][i] = current[name]
+            current[name] = 0
+        self.start_ns[i] = self.frame_start
+        self.particles[i] = len(self.game.particles)
+        renders = self.glyph_renders()
+        self.renders[i] = renders - self.renders_total
+        self.renders_total = renders
+        self.count += 1
+        self.frame_start = time.perf_counter_ns()
+    
+    def recent(self):
+        """缓冲区中各帧的下标（从旧到新）"""
+        n = min(self.count, self.CAPACITY)
+        start = self.count - n
+        return [(start + k) % self.CAPACITY for k in range(n)]
+    
+    def update_overlay(self):
+        """重新计算并渲染叠加层的文字"""
+        self.overlay_time = time.perf_counter()
+        frames = self.recent()
+        if not frames:
+            return
+        busy_phases = [self.phases[name] for name in self.PHASES[:-1]]
+        busy = sorted(sum(phase[i] for phase in busy_phases) for i in frames)
+        
+        last = frames[-1]
+        means = "  ".join(f"{label} {sum(self.phases[name][i] for i in frames) / len(frames) / 1e6:.2f}"
+                          for label, name in zip(self.PHASE_NAMES, self.PHASES))
+        lines = [
+            f"帧耗时(ms) p50 {percentile(busy, 0.5) / 1e6:.2f}  p95 {percentile(busy, 0.95) / 1e6:.2f}  "
+            f"p99 {percentile(busy, 0.99) / 1e6:.2f}",
+            f"各阶段平均(ms) {means}",
+            f"粒子 {self.particles[last]}  字形渲染 {self.renders[last]}/帧  已记录 {self.count} 帧",
+            "F3 关闭  F4 导出CSV",
+        ]
+        font = self.game.fonts['small']
+        self.overlay = [font.render(line, True, COLORS['text']) for line in lines]
+    
+    def draw_overlay(self, screen):
+        """在屏幕左下角绘制叠加层"""
+        rect = self.OVERLAY_RECT
+        screen.fill((0, 0, 0), rect)
+        screen.blits([(surf, (rect.x + 6, rect.y + 4 + i * 22)) for i, surf in enumerate(self.overlay)],
+                     doreturn=False)
+    
+    def dump_csv(self, path):
+        """把缓冲区中每一帧的数据写入CSV文件"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", "start_ns", *(f"{name}_ns" for name in self.PHASES),
+                             "particles", "glyph_renders"])
+            first = self.count - min(self.count, self.CAPACITY)
+            for k, i in enumerate(self.recent()):
+                writer.writerow([first + k, self.start_ns[i], *(self.phases[name][i] for name in self.PHASES),
+                                 self.particles[i], self.renders[i]])
+
+
 class Button:
     """按钮类"""
     def __init__(self, x, y, width, height, text, color, text_color):
@@ -137,14 +754,19 @@ class Button:
         self.color = color
         self.text_color = text_color
         self.hover = False
+        self.text_surf = None  # (字体, 渲染好的按钮文字)
     
-    def draw(self, screen, font):
-        """绘制按钮"""
-        color = tuple(min(c + 30, 255) for c in self.color) if self.hover else self.color
+    def draw(self, screen, font, hover=None):
+        """绘制按钮（hover为None时按当前的鼠标悬停状态绘制）"""
+        if hover is None:
+            hover = self.hover
+        color = tuple(min(c + 30, 255) for c in self.color) if hover else self.color
         pygame.draw.rect(screen, color, self.rect, border_radius=10)
         pygame.draw.rect(screen, COLORS['text'], self.rect, 2, border_radius=10)
         
-        text_surf = font.render(self.text, True, self.text_color)
+        if self.text_surf is None or self.text_surf[0] is not font:
+            self.text_surf = (font, font.render(self.text, True, self.text_color))
+        text_surf = self.text_surf[1]
         text_rect = text_surf.get_rect(center=self.rect.center)
         screen.blit(text_surf, text_rect)
     
@@ -158,72 +780,171 @@ class Button:
         return False
 
 
-class Particle:
-    """粒子效果类"""
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        self.vx = random.uniform(-3, 3)
-        self.vy = random.uniform(-5, -1)
-        self.color = color
-        self.life = 30
-        self.max_life = 30
+class ParticlePool:
+    """
+    粒子池
+    所有粒子的位置、速度等分别存放在平行的列表中（而不是每个粒子一个对象），
+    每帧用map()对整列运算；粒子按产生顺序存放，寿命耗尽的总是开头的一段，一次删除即可。
+    绘制时从预先画好的圆形精灵图集中取图，用一次screen.blits()贴出全部粒子，每帧不创建任何Surface
+    """
+    MAX_LIFE = 30
+    MAX_SIZE = 5
+    GRAVITY = 0.2
+    
+    def __init__(self):
+        self.colors = []   # 出现过的颜色
+        self.atlas = []    # 精灵图集：每种颜色MAX_LIFE + 1项(精灵Surface, 半径)，按剩余寿命排列
+        self.frame = 0     # 已经更新的帧数
+        self.clear()
+    
+    def __len__(self):
+        return len(self.birth)
+    
+    def clear(self):
+        """移除所有粒子"""
+        self.x = []
+        self.y = []
+        self.vx = []
+        self.vy = []
+        self.birth = []  # 产生时的帧号（从前到后不减）
+        self.base = []   # 粒子颜色在图集中的起始下标
+    
+    def atlas_base(self, color):
+        """颜色在图集中的起始下标；第一次出现时为它画好每个寿命对应的精灵"""
+        try:
+            return self.colors.index(color) * (self.MAX_LIFE + 1)
+        except ValueError:
+            pass
+        # 寿命与大小、透明度一一对应，因此按寿命预先画好全部MAX_LIFE种精灵
+        base = len(self.atlas)
+        self.atlas.append((None, 0))
+        for life in range(1, self.MAX_LIFE + 1):
+            alpha = int(255 * (life / self.MAX_LIFE))
+            size = int(self.MAX_SIZE * (life / self.MAX_LIFE))
+            sprite = None
+            if size > 0:
+                sprite = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+                pygame.draw.circle(sprite, (*color, alpha), (size, size), size)
+            self.atlas.append((sprite, size))
+        self.colors.append(color)
+        return base
+    
+    def add(self, x, y, vx, vy, color):
+        """添加一个粒子"""
+        self.x.append(x)
+        self.y.append(y)
+        self.vx.append(vx)
+        self.vy.append(vy)
+        self.birth.append(self.frame)
+        self.base.append(self.atlas_base(color))
+    
+    def burst(self, x, y, color, count):
+        """在(x, y)处产生一批向上飞溅的粒子"""
+        uniform = random.uniform
+        for _ in range(count):
+            self.add(x, y, uniform(-3, 3), uniform(-5, -1), color)
     
     def update(self):
-        """更新粒子"""
-        self.x += self.vx
-        self.y += self.vy
-        self.vy += 0.2  # 重力
-        self.life -= 1
+        """移动所有粒子并剔除寿命耗尽的粒子"""
+        self.frame += 1
+        if not self.birth:
+            return
+        self.x = list(map(operator.add, self.x, self.vx))
+        self.y = list(map(operator.add, self.y, self.vy))
+        self.vy = list(map(self.GRAVITY.__add__, self.vy))  # 重力
+        
+        dead = bisect_right(self.birth, self.frame - self.MAX_LIFE)
+        if dead:
+            for column in (self.x, self.y, self.vx, self.vy, self.birth, self.base):
+                del column[:dead]
     
     def draw(self, screen):
-        """绘制粒子"""
-        if self.life > 0:
-            alpha = int(255 * (self.life / self.max_life))
-            size = int(5 * (self.life / self.max_life))
-            color = (*self.color, alpha)
-            s = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
-            pygame.draw.circle(s, color, (size, size), size)
-            screen.blit(s, (int(self.x - size), int(self.y - size)))
+        """用一次blits()绘制所有粒子"""
+        atlas = self.atlas
+        # 剩余寿命 = MAX_LIFE - (当前帧 - 产生帧)，精灵下标 = 颜色起始下标 + 剩余寿命
+        offset = self.MAX_LIFE - self.frame
+        blits = []
+        for base, birth, x, y in zip(self.base, self.birth, self.x, self.y):
+            sprite, size = atlas[base + birth + offset]
+            if sprite is not None:
+                blits.append((sprite, (int(x - size), int(y - size))))
+        if blits:
+            screen.blits(blits, doreturn=False)
     
-    def is_alive(self):
-        """检查粒子是否存活"""
-        return self.life > 0
+    def bounds(self):
+        """所有粒子覆盖的矩形（没有粒子时为None）"""
+        if not self.birth:
+            return None
+        left, right = min(self.x), max(self.x)
+        top, bottom = min(self.y), max(self.y)
+        pad = self.MAX_SIZE + 1
+        return pygame.Rect(left - pad, top - pad, right - left + pad * 2, bottom - top + pad * 2)
 
 
 class TypingGameGUI:
-    def __init__(self):
+    def __init__(self, history=None, profile=None, stats_hz=4, profile_frames=False, latency=None,
+                 passage=None, corpus=None):
+        # 启动耗时记录（--profile-startup），不需要时为None
+        self.profile = profile
+        init_pygame()
+        if profile:
+            profile.mark("初始化pygame")
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("⌨️ 超级打字练习游戏")
         self.clock = pygame.time.Clock()
+        if profile:
+            profile.mark("创建窗口")
         
         # 加载支持中文的字体
-        print("正在加载字体...")
-        self.fonts = {
-            'title': get_chinese_font(FONT_SIZES['title']),
-            'subtitle': get_chinese_font(FONT_SIZES['subtitle']),
-            'text': get_chinese_font(FONT_SIZES['text']),
-            'small': get_chinese_font(FONT_SIZES['small']),
-        }
-        print("✓ 字体加载完成")
+        self.fonts = FontSet(find_chinese_font())
+        if profile:
+            profile.mark("查找字体")
         
         self.difficulty = "中等"
         self.current_text = ""
-        self.user_input = ""
-        self.start_time = 0
-        self.end_time = 0
-        self.is_running = False
+        # 长文模式的练习文本（从文件映射），为None时使用内置的短文本
+        self.passage = passage
+        self.passage_view = None  # 长文模式的滚动视口
+        # 外部语料（--corpus），为None时从内置的TEXTS中选取练习文本
+        self.corpus = corpus
+        self.session = TypingSession()
+        # 输入缓冲和计分器在每局之间复用，这里保存引用方便绘制代码使用
+        self.user_input = self.session.buffer
+        self.score = self.session.score
         self.state = "menu"  # menu, playing, results
         
-        self.particles = []
-        self.score = 0
-        self.combo = 0
+        self.particles = ParticlePool()
+        self.glyphs = GlyphCache()
+        self.dirty = DirtyRegions()
+        self.gradient_bars = {}        # (宽, 高) -> 进度条渐变Surface
+        self.layers = {}               # 图层名 -> (key, 预先画好的静态图层)
+        self.stat_surfaces = GlyphCache(capacity=64)  # 统计文字 -> Surface
+        # 统计数值在没有输入时的重新计算间隔（秒），0表示只在输入时计算
+        self.stats_interval = 1 / stats_hz if stats_hz > 0 else float("inf")
+        self.stats_key = None
+        self.stats_time = 0.0
+        self.stats_cache = None
+        # 分阶段耗时记录（F3开关），关闭时为None
+        self.profiler = None
+        if profile_frames:
+            self.toggle_profiler()
+        self.drawn_state = None        # 上一帧绘制的界面
+        self.particle_rect = None      # 上一帧粒子覆盖的区域
+        # 历史成绩库，无法打开时为None
+        self.history = history
+        # 按键到显示的延迟测量（--latency），不测量时为None
+        self.latency = latency
         
         # 结果界面按钮
         self.restart_btn = None
         self.menu_btn = None
         
         self.create_menu_buttons()
+        
+        # 长文模式直接开始练习
+        if self.passage is not None:
+            self.prepare_game()
+            self.state = "playing"
     
     def create_menu_buttons(self):
         """创建菜单按钮"""
@@ -242,138 +963,233 @@ class TypingGameGUI:
             button = Button(x, y, button_width, button_height, diff, color, COLORS['text'])
             self.menu_buttons.append((button, diff))
     
+    def static_layer(self, name, key, build):
+        """
+        界面中不变的部分（背景、标题、边框、标签等）预先画成一张整屏图层，每帧只需一次blit。
+        第一次使用、key变化或者字体、配色变化时调用build(surface)重新绘制
+        """
+        key = (key, id(self.fonts), tuple(COLORS.values()))
+        cached = self.layers.get(name)
+        if cached is None or cached[0] != key:
+            surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+            surface.fill(COLORS['background'])
+            build(surface)
+            cached = self.layers[name] = (key, surface)
+        return cached[1]
+    
     def show_menu(self):
         """显示菜单"""
-        self.screen.fill(COLORS['background'])
+        self.screen.blit(self.static_layer("menu", None, self.draw_menu_layer), (0, 0))
         
+        # 图层中的按钮是未悬停的样子，只需重画鼠标悬停的按钮
+        for button, _ in self.menu_buttons:
+            if button.hover:
+                button.draw(self.screen, self.fonts['subtitle'])
+    
+    def draw_menu_layer(self, surface):
+        """菜单中不变的部分"""
         # 标题
         title = self.fonts['title'].render("⌨️ 超级打字练习", True, COLORS['highlight'])
         title_rect = title.get_rect(center=(WINDOW_WIDTH // 2, 100))
-        self.screen.blit(title, title_rect)
+        surface.blit(title, title_rect)
         
         # 副标题
         subtitle = self.fonts['subtitle'].render("选择你的挑战难度", True, COLORS['text'])
         subtitle_rect = subtitle.get_rect(center=(WINDOW_WIDTH // 2, 180))
-        self.screen.blit(subtitle, subtitle_rect)
+        surface.blit(subtitle, subtitle_rect)
         
         # 绘制按钮
         for button, _ in self.menu_buttons:
-            button.draw(self.screen, self.fonts['subtitle'])
+            button.draw(surface, self.fonts['subtitle'], hover=False)
         
         # 提示信息
         hint = self.fonts['small'].render("ESC 退出游戏", True, COLORS['gray'])
         hint_rect = hint.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT - 40))
-        self.screen.blit(hint, hint_rect)
+        surface.blit(hint, hint_rect)
     
     def prepare_game(self):
         """准备游戏"""
-        self.current_text = random.choice(TEXTS[self.difficulty])
-        self.user_input = ""
-        self.start_time = 0
-        self.end_time = 0
-        self.is_running = False
-        self.particles = []
-        self.score = 0
-        self.combo = 0
+        if self.passage is not None:
+            self.current_text = self.passage
+            self.passage_view = PassageView(self.passage, self.glyphs, self.fonts['text'],
+                                            (50, 110, WINDOW_WIDTH - 100, 320))
+        else:
+            self.current_text = self.pick_text()
+            self.passage_view = None
+        self.session.reset(self.current_text)
+        self.particles.clear()
+        if self.latency is not None:
+            self.latency.begin_session(self.mode_name())
+    
+    def pick_text(self):
+        """随机选取当前难度的练习文本：有外部语料时从语料中抽取，语料中没有这个难度时使用内置文本"""
+        if self.corpus is not None:
+            text = self.corpus.sample(self.difficulty)
+            if text:
+                return text
+        return random.choice(TEXTS[self.difficulty])
+    
+    def mode_name(self):
+        """本局的难度名称（用于历史成绩和延迟统计）"""
+        return "长文" if self.passage is not None else self.difficulty
+    
+    def back_to_menu(self):
+        """返回菜单（从长文模式返回后改用内置文本）"""
+        self.state = "menu"
+        self.passage = None
+        self.passage_view = None
     
     def draw_game_screen(self):
         """绘制游戏界面"""
-        self.screen.fill(COLORS['background'])
+        if self.passage_view is not None:
+            self.draw_passage_screen()
+            return
+        
+        # 标题、目标文本、输入框和统计面板的背景在一局中都不变
+        layer = self.static_layer("game", (self.difficulty, self.current_text), self.draw_game_layer)
+        self.screen.blit(layer, (0, 0))
+        
+        input_y = 280
         
+        # 显示用户输入（带颜色）：每个字符画在目标文本排版中对应字符的位置，与目标文本的换行一致；
+        # 字符Surface全部取自字形缓存，最后一次性blit
+        font = self.fonts['text']
+        layout = layout_text(self.current_text, font, WINDOW_WIDTH - 140, COLORS['text'])
+        xs, ys = layout.xs, layout.ys
+        glyph = self.glyphs.get
+        correct_color = COLORS['correct']
+        error_color = COLORS['error']
+        marks = self.score.marks
+        x0 = 70
+        y0 = input_y + 20
+        blits = [(glyph(font, char, correct_color if marks[i] else error_color), (x0 + xs[i], y0 + ys[i]))
+                 for i, char in enumerate(self.user_input)]
+        
+        # 光标
+        if self.cursor_visible():
+            x, y = layout.position(len(self.user_input))
+            blits.append((glyph(font, "_", COLORS['highlight']), (x0 + x, y0 + y)))
+        self.screen.blits(blits, doreturn=False)
+        
+        # 统计信息
+        self.draw_stats()
+        
+        # 绘制粒子效果
+        self.draw_particles()
+    
+    def draw_game_layer(self, surface):
+        """游戏界面中一局之内不变的部分"""
         # 标题
         title = self.fonts['subtitle'].render(f"难度: {self.difficulty}", True, COLORS['highlight'])
-        self.screen.blit(title, (20, 20))
+        surface.blit(title, (20, 20))
         
         # 提示
         hint = self.fonts['small'].render("ESC 返回菜单", True, COLORS['gray'])
-        self.screen.blit(hint, (WINDOW_WIDTH - 200, 20))
+        surface.blit(hint, (WINDOW_WIDTH - 200, 20))
         
         # 目标文本区域
         target_y = 120
         target_label = self.fonts['subtitle'].render("目标文本:", True, COLORS['accent'])
-        self.screen.blit(target_label, (50, target_y - 40))
+        surface.blit(target_label, (50, target_y - 40))
         
         # 绘制目标文本框
         text_box_rect = pygame.Rect(50, target_y, WINDOW_WIDTH - 100, 100)
-        pygame.draw.rect(self.screen, (40, 40, 50), text_box_rect, border_radius=10)
-        pygame.draw.rect(self.screen, COLORS['accent'], text_box_rect, 2, border_radius=10)
+        pygame.draw.rect(surface, (40, 40, 50), text_box_rect, border_radius=10)
+        pygame.draw.rect(surface, COLORS['accent'], text_box_rect, 2, border_radius=10)
         
         # 显示目标文本
         self.draw_wrapped_text(self.current_text, 70, target_y + 20, WINDOW_WIDTH - 140, 
-                              self.fonts['text'], COLORS['text'])
+                              self.fonts['text'], COLORS['text'], surface)
         
         # 用户输入区域
         input_y = 280
         input_label = self.fonts['subtitle'].render("你的输入:", True, COLORS['highlight'])
-        self.screen.blit(input_label, (50, input_y - 40))
+        surface.blit(input_label, (50, input_y - 40))
         
         # 绘制输入框
         input_box_rect = pygame.Rect(50, input_y, WINDOW_WIDTH - 100, 100)
-        pygame.draw.rect(self.screen, (40, 40, 50), input_box_rect, border_radius=10)
-        pygame.draw.rect(self.screen, COLORS['highlight'], input_box_rect, 2, border_radius=10)
-        
-        # 显示用户输入（带颜色）
-        x = 70
-        y = input_y + 20
-        for i, char in enumerate(self.user_input):
-            if i < len(self.current_text):
-                color = COLORS['correct'] if char == self.current_text[i] else COLORS['error']
-            else:
-                color = COLORS['error']
-            
-            char_surf = self.fonts['text'].render(char, True, color)
-            self.screen.blit(char_surf, (x, y))
-            x += char_surf.get_width()
-            
-            # 换行处理
-            if x > WINDOW_WIDTH - 130:
-                x = 70
-                y += 35
+        pygame.draw.rect(surface, (40, 40, 50), input_box_rect, border_radius=10)
+        pygame.draw.rect(surface, COLORS['highlight'], input_box_rect, 2, border_radius=10)
         
-        # 光标
-        if int(time.time() * 2) % 2 == 0:
-            cursor_surf = self.fonts['text'].render("_", True, COLORS['highlight'])
-            self.screen.blit(cursor_surf, (x, y))
+        # 统计面板背景和进度条的背景条（draw_stats()在其上绘制）
+        stats_y = 440
+        stats_rect = pygame.Rect(50, stats_y, WINDOW_WIDTH - 100, 200)
+        pygame.draw.rect(surface, (30, 30, 40), stats_rect, border_radius=10)
+        pygame.draw.rect(surface, (60, 60, 70), (70, stats_y + 170, WINDOW_WIDTH - 140, 20),
+                         border_radius=10)
+    
+    def draw_passage_screen(self):
+        """绘制长文模式的游戏界面：目标文本和输入在同一个滚动视口中逐行对齐显示"""
+        view = self.passage_view
+        layer = self.static_layer("game", (self.difficulty, self.current_text), self.draw_passage_layer)
+        self.screen.blit(layer, (0, 0))
+        
+        # 当前行号
+        line = view.line_of(self.session.position) + 1
+        total = view.line_count()
+        label = f"第 {line}/{total} 行" if total else f"第 {line} 行"
+        self.screen.blit(self.stat_surfaces.get(self.fonts['small'], label, COLORS['gray']),
+                         (WINDOW_WIDTH - 250, 80))
+        
+        view.draw(self.screen, self.user_input, self.score.marks, COLORS['text'],
+                  COLORS['correct'], COLORS['error'],
+                  COLORS['highlight'] if self.cursor_visible() else None)
         
         # 统计信息
         self.draw_stats()
         
         # 绘制粒子效果
-        for particle in self.particles:
-            particle.draw(self.screen)
+        self.draw_particles()
     
-    def draw_wrapped_text(self, text, x, y, max_width, font, color):
-        """绘制自动换行的文本"""
-        words = text.split()
-        lines = []
-        current_line = ""
+    def draw_passage_layer(self, surface):
+        """长文模式的游戏界面中不变的部分"""
+        title = self.fonts['subtitle'].render(f"长文模式: {self.passage.name}", True, COLORS['highlight'])
+        surface.blit(title, (20, 20))
         
-        for word in words:
-            test_line = current_line + word + " "
-            if font.size(test_line)[0] <= max_width:
-                current_line = test_line
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word + " "
+        hint = self.fonts['small'].render("ESC 返回菜单", True, COLORS['gray'])
+        surface.blit(hint, (WINDOW_WIDTH - 200, 20))
         
-        if current_line:
-            lines.append(current_line)
+        label = self.fonts['subtitle'].render("目标文本 / 你的输入:", True, COLORS['accent'])
+        surface.blit(label, (50, 72))
         
-        for i, line in enumerate(lines):
-            line_surf = font.render(line, True, color)
-            self.screen.blit(line_surf, (x, y + i * 35))
-    
-    def draw_stats(self):
-        """绘制统计信息"""
-        stats_y = 440
+        # 视口边框
+        view_rect = self.passage_view.rect
+        pygame.draw.rect(surface, (40, 40, 50), view_rect, border_radius=10)
+        pygame.draw.rect(surface, COLORS['accent'], view_rect, 2, border_radius=10)
         
-        # 背景
+        # 统计面板背景和进度条的背景条（draw_stats()在其上绘制）
+        stats_y = 440
         stats_rect = pygame.Rect(50, stats_y, WINDOW_WIDTH - 100, 200)
-        pygame.draw.rect(self.screen, (30, 30, 40), stats_rect, border_radius=10)
+        pygame.draw.rect(surface, (30, 30, 40), stats_rect, border_radius=10)
+        pygame.draw.rect(surface, (60, 60, 70), (70, stats_y + 170, WINDOW_WIDTH - 140, 20),
+                         border_radius=10)
+    
+    def draw_wrapped_text(self, text, x, y, max_width, font, color, surface=None):
+        """绘制自动换行的文本（默认画在屏幕上），排版结果会被缓存"""
+        if surface is None:
+            surface = self.screen
+        layout = layout_text(text, font, max_width, color)
+        surface.blits(layout.blits(x, y), doreturn=False)
+        return layout
+    
+    def cursor_visible(self):
+        """光标闪烁：每0.5秒切换一次"""
+        return int(time.time() * 2) % 2 == 0
+    
+    def stats_snapshot(self):
+        """
+        统计面板要显示的文字和进度（绘制面板和判断面板是否变化共用）
+        输入变化时立即重新计算；没有输入时（只有WPM随时间变化）每stats_interval秒重新计算一次
+        """
+        now = time.perf_counter()
+        key = (self.current_text, self.score.typed, self.score.backspaces)
+        if key == self.stats_key and now - self.stats_time < self.stats_interval:
+            return self.stats_cache
+        self.stats_key = key
+        self.stats_time = now
         
         # 进度
-        progress = len(self.user_input) / len(self.current_text) if self.current_text else 0
+        progress = self.session.progress()
         progress_text = f"进度: {progress * 100:.1f}%"
         
         # 准确率
@@ -385,73 +1201,130 @@ class TypingGameGUI:
         wpm_text = f"速度: {wpm:.1f} WPM"
         
         # Combo
-        combo_text = f"连击: {self.combo}x"
+        combo_text = f"连击: {self.score.combo}x"
+        
+        self.stats_cache = (progress_text, accuracy_text, wpm_text, combo_text), progress
+        return self.stats_cache
+    
+    def draw_stats(self):
+        """绘制统计信息（面板背景在游戏界面的静态图层中）"""
+        stats_y = 440
         
         # 显示统计
-        stats = [progress_text, accuracy_text, wpm_text, combo_text]
+        stats, progress = self.stats_snapshot()
         colors = [COLORS['accent'], COLORS['correct'], COLORS['highlight'], COLORS['purple']]
         
-        for i, (stat, color) in enumerate(zip(stats, colors)):
-            stat_surf = self.fonts['subtitle'].render(stat, True, color)
-            self.screen.blit(stat_surf, (70, stats_y + 20 + i * 40))
+        # 文字Surface按内容缓存，数值不变时不重新渲染
+        font = self.fonts['subtitle']
+        self.screen.blits([(self.stat_surfaces.get(font, stat, color), (70, stats_y + 20 + i * 40))
+                           for i, (stat, color) in enumerate(zip(stats, colors))], doreturn=False)
         
         # 进度条
         bar_y = stats_y + 170
         bar_width = WINDOW_WIDTH - 140
         bar_height = 20
         
-        # 背景条
-        pygame.draw.rect(self.screen, (60, 60, 70), (70, bar_y, bar_width, bar_height), border_radius=10)
-        
         # 进度条
         filled_width = int(bar_width * progress)
         if filled_width > 0:
-            # 渐变效果
-            for x in range(filled_width):
-                ratio = x / bar_width
+            # 渐变效果：只贴出预先画好的渐变条中已完成的部分
+            gradient = self.gradient_bar(bar_width, bar_height)
+            self.screen.blit(gradient, (70, bar_y), (0, 0, filled_width, bar_height))
+            
+            pygame.draw.rect(self.screen, COLORS['highlight'], 
+                           (70, bar_y, filled_width, bar_height), 2, border_radius=10)
+    
+    def gradient_bar(self, width, height):
+        """整条进度条的渐变Surface，每种尺寸只绘制一次"""
+        surf = self.gradient_bars.get((width, height))
+        if surf is None:
+            surf = pygame.Surface((width, height)).convert()
+            for x in range(width):
+                ratio = x / width
                 color = (
                     int(COLORS['correct'][0] * (1 - ratio) + COLORS['accent'][0] * ratio),
                     int(COLORS['correct'][1] * (1 - ratio) + COLORS['accent'][1] * ratio),
                     int(COLORS['correct'][2] * (1 - ratio) + COLORS['accent'][2] * ratio),
                 )
-                pygame.draw.rect(self.screen, color, (70 + x, bar_y, 1, bar_height))
-            
-            pygame.draw.rect(self.screen, COLORS['highlight'], 
-                           (70, bar_y, filled_width, bar_height), 2, border_radius=10)
+                pygame.draw.rect(surf, color, (x, 0, 1, height))
+            self.gradient_bars[(width, height)] = surf
+        return surf
     
     def calculate_accuracy(self):
         """计算准确率"""
-        if len(self.user_input) == 0:
-            return 100.0
-        
-        correct = sum(1 for i, char in enumerate(self.user_input) 
-                     if i < len(self.current_text) and char == self.current_text[i])
-        return (correct / len(self.user_input)) * 100
+        return self.score.accuracy()
     
     def calculate_wpm(self):
         """计算WPM"""
-        if not self.is_running or self.start_time == 0:
-            return 0.0
-        
-        elapsed_time = time.time() - self.start_time
-        if elapsed_time == 0:
-            return 0.0
-        
-        minutes = elapsed_time / 60
-        words = len(self.user_input) / 5
-        return words / minutes if minutes > 0 else 0.0
+        return self.session.wpm(time.perf_counter_ns())
     
     def add_particle_burst(self, x, y, color, count=10):
         """添加粒子爆发效果"""
-        for _ in range(count):
-            self.particles.append(Particle(x, y, color))
+        self.particles.burst(x, y, color, count)
+    
+    def particle_bounds(self):
+        """当前所有粒子覆盖的矩形（没有粒子时为None）"""
+        rect = self.particles.bounds()
+        return rect.clip(self.screen.get_rect()) if rect else None
+    
+    def find_dirty_regions(self):
+        """与上一帧比较，标记内容发生变化的区域"""
+        dirty = self.dirty
+        if self.state != self.drawn_state:
+            dirty.invalidate()
+            self.drawn_state = self.state
+        
+        if self.state == "menu":
+            buttons = [button for button, _ in self.menu_buttons]
+        elif self.state == "results":
+            buttons = [b for b in (self.restart_btn, self.menu_btn) if b is not None]
+        elif self.passage_view is not None:
+            buttons = []
+            # 长文模式：行号和视口随输入和滚动变化
+            dirty.check("passage", (self.current_text, self.score.typed, self.score.backspaces,
+                                    self.cursor_visible(), int(self.passage_view.scroll)),
+                        (0, 0, WINDOW_WIDTH, 440))
+            dirty.check("stats", self.stats_snapshot(), (50, 440, WINDOW_WIDTH - 100, 200))
+        else:
+            buttons = []
+            dirty.check("target", (self.difficulty, self.current_text), (0, 0, WINDOW_WIDTH, 240))
+            dirty.check("input", (self.score.typed, self.score.backspaces, self.cursor_visible()),
+                        (50, 240, WINDOW_WIDTH - 100, 200))
+            dirty.check("stats", self.stats_snapshot(), (50, 440, WINDOW_WIDTH - 100, 200))
+        if buttons:
+            dirty.check("buttons", tuple(b.hover for b in buttons),
+                        buttons[0].rect.unionall([b.rect for b in buttons[1:]]))
+        
+        # 粒子移动时，上一帧和这一帧覆盖的区域都要重绘
+        bounds = self.particle_bounds()
+        if bounds or self.particle_rect:
+            dirty.mark(bounds)
+            dirty.mark(self.particle_rect)
+        self.particle_rect = bounds
+    
+    def draw_current_screen(self):
+        """绘制当前界面"""
+        if self.state == "menu":
+            self.show_menu()
+        elif self.state == "playing":
+            self.draw_game_screen()
+        elif self.state == "results":
+            self.show_results()
+    
+    def update_particles(self):
+        """移除消失的粒子并更新其余粒子，长文模式下同时滚动视口（每帧一次）"""
+        self.particles.update()
+        if self.passage_view is not None and self.state == "playing":
+            self.passage_view.update(self.session.position)
+    
+    def draw_particles(self):
+        """绘制所有粒子"""
+        self.particles.draw(self.screen)
     
     def show_results(self):
         """显示结果"""
-        self.screen.fill(COLORS['background'])
-        
         # 计算统计
-        elapsed_time = self.end_time - self.start_time
+        elapsed_time = self.session.elapsed()
         wpm = self.calculate_wpm()
         accuracy = self.calculate_accuracy()
         
@@ -469,31 +1342,14 @@ class TypingGameGUI:
             rating = "💪 继续加油！"
             rating_color = COLORS['purple']
         
-        # 标题
-        title = self.fonts['title'].render("游戏结束", True, COLORS['highlight'])
-        title_rect = title.get_rect(center=(WINDOW_WIDTH // 2, 80))
-        self.screen.blit(title, title_rect)
-        
-        # 评级
-        rating_surf = self.fonts['title'].render(rating, True, rating_color)
-        rating_rect = rating_surf.get_rect(center=(WINDOW_WIDTH // 2, 160))
-        self.screen.blit(rating_surf, rating_rect)
-        
         # 统计信息
-        stats = [
+        stats = (
             f"用时: {elapsed_time:.2f} 秒",
             f"速度: {wpm:.1f} WPM",
             f"准确率: {accuracy:.1f}%",
             f"总字符: {len(self.user_input)}",
-            f"最高连击: {self.combo}",
-        ]
-        
-        y = 260
-        for stat in stats:
-            stat_surf = self.fonts['subtitle'].render(stat, True, COLORS['text'])
-            stat_rect = stat_surf.get_rect(center=(WINDOW_WIDTH // 2, y))
-            self.screen.blit(stat_surf, stat_rect)
-            y += 50
+            f"最高连击: {self.score.max_combo}",
+        )
         
         # 按钮
         button_y = 520
@@ -505,51 +1361,79 @@ class TypingGameGUI:
         if self.restart_btn is None:
             self.restart_btn = Button(WINDOW_WIDTH // 2 - button_width - spacing // 2, button_y,
                                button_width, button_height, "重新开始", COLORS['correct'], COLORS['text'])
-        self.restart_btn.draw(self.screen, self.fonts['subtitle'])
         
         # 创建或更新返回菜单按钮
         if self.menu_btn is None:
             self.menu_btn = Button(WINDOW_WIDTH // 2 + spacing // 2, button_y,
                             button_width, button_height, "返回菜单", COLORS['accent'], COLORS['text'])
-        self.menu_btn.draw(self.screen, self.fonts['subtitle'])
+        
+        # 结果在这一局结束后不再变化，连同按钮一起画成静态图层
+        layer = self.static_layer(
+            "results", (rating, stats),
+            lambda surface: self.draw_results_layer(surface, rating, rating_color, stats))
+        self.screen.blit(layer, (0, 0))
+        
+        # 只需重画鼠标悬停的按钮
+        for button in (self.restart_btn, self.menu_btn):
+            if button.hover:
+                button.draw(self.screen, self.fonts['subtitle'])
         
         # 绘制粒子效果（完成时的烟花）
-        for particle in self.particles:
-            particle.draw(self.screen)
+        self.draw_particles()
+    
+    def draw_results_layer(self, surface, rating, rating_color, stats):
+        """结果界面中不变的部分"""
+        # 标题
+        title = self.fonts['title'].render("游戏结束", True, COLORS['highlight'])
+        title_rect = title.get_rect(center=(WINDOW_WIDTH // 2, 80))
+        surface.blit(title, title_rect)
+        
+        # 评级
+        rating_surf = self.fonts['title'].render(rating, True, rating_color)
+        rating_rect = rating_surf.get_rect(center=(WINDOW_WIDTH // 2, 160))
+        surface.blit(rating_surf, rating_rect)
+        
+        # 统计信息
+        y = 260
+        for stat in stats:
+            stat_surf = self.fonts['subtitle'].render(stat, True, COLORS['text'])
+            stat_rect = stat_surf.get_rect(center=(WINDOW_WIDTH // 2, y))
+            surface.blit(stat_surf, stat_rect)
+            y += 50
+        
+        # 按钮（未悬停的样子）
+        self.restart_btn.draw(surface, self.fonts['subtitle'], hover=False)
+        self.menu_btn.draw(surface, self.fonts['subtitle'], hover=False)
     
     def handle_game_input(self, event):
         """处理游戏输入"""
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
-                self.state = "menu"
+                self.back_to_menu()
                 return
             
             elif event.key == pygame.K_BACKSPACE:
-                if len(self.user_input) > 0:
-                    self.user_input = self.user_input[:-1]
-                    self.combo = 0
+                now = time.perf_counter_ns()
+                if self.session.backspace(now) and self.latency is not None:
+                    self.latency.key(now)
             
-            elif event.unicode and len(event.unicode) == 1 and 32 <= ord(event.unicode) <= 126:
-                # 第一次输入开始计时
-                if not self.is_running:
-                    self.start_time = time.time()
-                    self.is_running = True
-                
-                char = event.unicode
-                self.user_input += char
+            elif event.unicode and len(event.unicode) == 1 and is_typable(event.unicode):
+                # 第一次输入开始计时；检查正确性并添加粒子效果
+                now = time.perf_counter_ns()
+                if self.latency is not None:
+                    self.latency.key(now)
+                if self.session.type_char(event.unicode, now):
+                    self.add_particle_burst(500, 300, COLORS['correct'], 5)
+                else:
+                    self.add_particle_burst(500, 300, COLORS['error'], 8)
                 
-                # 检查正确性并添加粒子效果
-                if len(self.user_input) <= len(self.current_text):
-                    if char == self.current_text[len(self.user_input) - 1]:
-                        self.combo += 1
-                        self.add_particle_burst(500, 300, COLORS['correct'], 5)
-                    else:
-                        self.combo = 0
-                        self.add_particle_burst(500, 300, COLORS['error'], 8)
-                
-                # 检查是否完成
-                if len(self.user_input) >= len(self.current_text):
-                    self.end_time = time.time()
+                # 检查是否完成（保存成绩和按键记录，后台写入）
+                if self.session.finished:
+                    if self.history is not None:
+                        self.history.record(self.session, self.mode_name(), "gui")
+                    # 最后一个字符显示在结果界面上，不计入延迟
+                    if self.latency is not None:
+                        self.latency.end_session()
                     self.state = "results"
                     # 完成时的烟花效果
                     for _ in range(50):
@@ -559,68 +1443,181 @@ class TypingGameGUI:
                                              COLORS['accent'], COLORS['purple']])
                         self.add_particle_burst(x, y, color, 3)
     
-    def run(self):
-        """运行游戏"""
-        running = True
-        
-        while running:
+    def idle_timeout(self):
+        """
+        没有动画时距离下一次需要重绘的时间（秒）：
+        游戏中是光标下一次闪烁或统计栏下一次刷新的时刻，其他界面按IDLE_HZ
+        """
+        timeout = 1 / IDLE_HZ
+        if self.state == "playing":
+            # 光标每0.5秒切换一次（见cursor_visible）
+            timeout = min(timeout, 0.5 - time.time() % 0.5)
+            if self.session.is_running and not self.session.finished:
+                timeout = min(timeout, self.stats_time + self.stats_interval - time.perf_counter())
+        return max(timeout, 0.001)
+    
+    def wait_events(self):
+        """
+        等待并取出下一批事件
+        有粒子动画或长文视口正在滚动时按FPS定时返回；否则阻塞在pygame.event.wait上，
+        直到有事件或者到了光标闪烁、统计刷新的时刻，空闲时几乎不占CPU
+        """
+        if (len(self.particles) or (self.passage_view is not None and self.passage_view.scrolling)
+                or pygame.display.get_driver() in POLLING_DRIVERS):
             self.clock.tick(FPS)
+            return pygame.event.get()
+        event = pygame.event.wait(int(self.idle_timeout() * 1000) + 1)
+        # 从空闲恢复时，不把等待的时间算进下一帧的FPS限速
+        self.clock.tick()
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+    
+    def toggle_profiler(self):
+        """打开或关闭分阶段耗时记录和屏幕叠加层"""
+        if self.profiler is None:
+            self.profiler = FrameProfiler(self)
+            self.profiler.attach()
+        else:
+            self.profiler.detach()
+            self.profiler = None
+    
+    def dump_frame_profile(self):
+        """把最近各帧的分阶段耗时导出到数据目录下的CSV文件"""
+        path = os.path.join(DATA_DIR, time.strftime("frames-%Y%m%d-%H%M%S.csv"))
+        try:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            self.profiler.dump_csv(path)
+            print(f"帧耗时已导出到 {path}")
+        except OSError as e:
+            print(f"无法导出帧耗时: {e}")
+    
+    def handle_events(self, events):
+        """处理一批事件，返回是否继续运行"""
+        running = True
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
             
-            # 更新粒子
-            self.particles = [p for p in self.particles if p.is_alive()]
-            for particle in self.particles:
-                particle.update()
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # 窗口被遮挡后重新显示，整屏重绘
+                self.dirty.invalidate()
+            
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE and self.state == "menu":
+                    running = False
+                elif event.key == pygame.K_F3:
+                    self.toggle_profiler()
+                elif event.key == pygame.K_F4 and self.profiler is not None:
+                    self.dump_frame_profile()
             
-            # 渲染（需要先渲染才能创建按钮）
             if self.state == "menu":
-                self.show_menu()
+                for button, difficulty in self.menu_buttons:
+                    if button.handle_event(event):
+                        self.difficulty = difficulty
+                        self.prepare_game()
+                        self.state = "playing"
+            
             elif self.state == "playing":
-                self.draw_game_screen()
+                self.handle_game_input(event)
+            
             elif self.state == "results":
-                self.show_results()
+                if self.restart_btn and self.restart_btn.handle_event(event):
+                    self.prepare_game()
+                    self.state = "playing"
+                    # 重置按钮以便下次重新创建
+                    self.restart_btn = None
+                    self.menu_btn = None
+                if self.menu_btn and self.menu_btn.handle_event(event):
+                    self.back_to_menu()
+                    # 重置按钮以便下次重新创建
+                    self.restart_btn = None
+                    self.menu_btn = None
+        return running
+    
+    def run(self):
+        """运行游戏"""
+        running = True
+        
+        while running:
+            # 更新粒子
+            self.update_particles()
             
-            # 显示更新
-            pygame.display.flip()
+            # 渲染（需要先渲染才能创建按钮）：只重绘并提交变化的区域，没有变化时跳过本帧
+            self.find_dirty_regions()
+            if self.dirty.has_changes():
+                path = "flip" if self.dirty.full else "update"
+                self.dirty.present(self.screen, self.draw_current_screen)
+                if self.latency is not None:
+                    self.latency.frame(path, time.perf_counter_ns())
+                if self.profile:
+                    self.profile.mark("显示首帧")
+                    print(self.profile.report())
+                    self.profile = None
             
             # 事件处理（在渲染之后，这样按钮已经创建）
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE and self.state == "menu":
-                        running = False
-                
-                if self.state == "menu":
-                    for button, difficulty in self.menu_buttons:
-                        if button.handle_event(event):
-                            self.difficulty = difficulty
-                            self.prepare_game()
-                            self.state = "playing"
-                
-                elif self.state == "playing":
-                    self.handle_game_input(event)
-                
-                elif self.state == "results":
-                    if self.restart_btn and self.restart_btn.handle_event(event):
-                        self.prepare_game()
-                        self.state = "playing"
-                        # 重置按钮以便下次重新创建
-                        self.restart_btn = None
-                        self.menu_btn = None
-                    if self.menu_btn and self.menu_btn.handle_event(event):
-                        self.state = "menu"
-                        # 重置按钮以便下次重新创建
-                        self.restart_btn = None
-                        self.menu_btn = None
+            running = self.handle_events(self.wait_events())
         
         pygame.quit()
 
 
-def main():
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="互动打字练习游戏 - 图形界面版")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="显示第一帧后打印启动各阶段（导入、初始化、字体、首帧）的耗时")
+    parser.add_argument("--stats-hz", type=float, default=4,
+                        help="没有输入时统计栏（WPM）的刷新频率，0表示只在输入时刷新")
+    parser.add_argument("--profile-frames", action="store_true",
+                        help="启动时就打开分阶段帧耗时记录和叠加层（游戏中按F3开关，F4导出CSV）")
+    parser.add_argument("--file", metavar="PATH",
+                        help="长文模式：练习指定文本文件的全部内容（任意大小，滚动显示）")
+    parser.add_argument("--corpus", metavar="PATH",
+                        help="从指定的文本语料（任意大小）中随机抽取练习句子，第一次使用时建立索引")
+    parser.add_argument("--latency", action="store_true",
+                        help="测量按键到显示的延迟，退出时打印每局和各渲染路径的延迟分布并保存为JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """主函数"""
-    game = TypingGameGUI()
-    game.run()
+    args = parse_args(argv)
+    passage = None
+    if args.file:
+        try:
+            passage = PassageFile(args.file)
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法打开练习文本: {e}")
+            sys.exit(1)
+    corpus = None
+    if args.corpus:
+        try:
+            corpus = Corpus(args.corpus, on_build=lambda p: print(f"正在为语料建立索引（只需一次）: {p}"))
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法打开语料: {e}")
+            sys.exit(1)
+    profile = None
+    if args.profile_startup:
+        profile = StartupProfile()
+        profile.mark("导入模块", STARTUP_IMPORTED)
+    history = open_history()
+    if profile:
+        profile.mark("打开历史成绩")
+    latency = LatencyMeter("gui") if args.latency else None
+    try:
+        game = TypingGameGUI(history, profile, stats_hz=args.stats_hz,
+                             profile_frames=args.profile_frames, latency=latency, passage=passage,
+                             corpus=corpus)
+        game.run()
+    finally:
+        if history is not None:
+            history.close()
+        if latency is not None:
+            print(latency.report())
+            try:
+                print(f"延迟数据已保存到 {latency.save()}")
+            except OSError as e:
+                print(f"无法保存延迟数据: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+打字练习游戏 - 历史成绩
+把每局练习的结果（连同按键记录）保存到本地SQLite数据库。
+写入在后台线程中进行，不会卡住游戏；最高成绩、总时间和每日进步曲线
+在写入时增量更新，查看历史成绩时只需读取几行汇总数据
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from typing_core import DATA_DIR, TypingSession
+
+HISTORY_PATH = os.path.join(DATA_DIR, "history.sqlite3")
+
+# 汇总表中表示“全部难度”的键
+ALL = ""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    date TEXT NOT NULL,
+    frontend TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    chars INTEGER NOT NULL,
+    elapsed REAL NOT NULL,
+    wpm REAL NOT NULL,
+    accuracy REAL NOT NULL,
+    errors INTEGER NOT NULL,
+    backspaces INTEGER NOT NULL,
+    max_combo INTEGER NOT NULL,
+    keylog BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_difficulty ON sessions (difficulty, started_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_date ON sessions (date);
+
+CREATE TABLE IF NOT EXISTS totals (
+    difficulty TEXT PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    total_time REAL NOT NULL,
+    total_chars INTEGER NOT NULL,
+    best_wpm REAL NOT NULL,
+    best_accuracy REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS daily (
+    date TEXT PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    total_time REAL NOT NULL,
+    wpm_sum REAL NOT NULL,
+    accuracy_sum REAL NOT NULL,
+    best_wpm REAL NOT NULL
+);
+"""
+
+INSERT_SESSION = """
+INSERT INTO sessions (started_at, date, frontend, difficulty, chars, elapsed, wpm,
+                      accuracy, errors, backspaces, max_combo, keylog)
+VALUES (:started_at, :date, :frontend, :difficulty, :chars, :elapsed, :wpm,
+        :accuracy, :errors, :backspaces, :max_combo, :keylog)
+"""
+
+UPSERT_TOTALS = """
+INSERT INTO totals (difficulty, sessions, total_time, total_chars, best_wpm, best_accuracy)
+VALUES (:totals_key, 1, :elapsed, :chars, :wpm, :accuracy)
+ON CONFLICT (difficulty) DO UPDATE SET
+    sessions = sessions + 1,
+    total_time = total_time + excluded.total_time,
+    total_chars = total_chars + excluded.total_chars,
+    best_wpm = MAX(best_wpm, excluded.best_wpm),
+    best_accuracy = MAX(best_accuracy, excluded.best_accuracy)
+"""
+
+UPSERT_DAILY = """
+INSERT INTO daily (date, sessions, total_time, wpm_sum, accuracy_sum, best_wpm)
+VALUES (:date, 1, :elapsed, :wpm, :accuracy, :wpm)
+ON CONFLICT (date) DO UPDATE SET
+    sessions = sessions + 1,
+    total_time = total_time + excluded.total_time,
+    wpm_sum = wpm_sum + excluded.wpm_sum,
+    accuracy_sum = accuracy_sum + excluded.accuracy_sum,
+    best_wpm = MAX(best_wpm, excluded.best_wpm)
+"""
+
+
+class HistoryStore:
+    """
+    历史成绩库
+    record()只把数据放进队列立即返回，由后台线程批量写入；
+    summary()从汇总表读取，耗时与记录总数无关
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = path
+        self.failed = 0  # 写入失败的记录数
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._reader = self._connect()
+        with self._reader:
+            self._reader.executescript(SCHEMA)
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="history-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, session: TypingSession, difficulty: str, frontend: str):
+        """保存一局已完成的练习（在后台线程中写入）"""
+        row = session.summary()
+        row["date"] = time.strftime("%Y-%m-%d", time.localtime(row["started_at"]))
+        row["difficulty"] = difficulty
+        row["frontend"] = frontend
+        # 按键记录的数组在下一局会被复用，这里先复制成字节串
+        row["keylog"] = session.keylog.to_bytes()
+        self._queue.put(row)
+
+    def _write_loop(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            conn = None  # 无法打开数据库：之后的记录都计为写入失败，但照常取出，flush()不会卡住
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            try:
+                # 把队列中积压的记录放在同一个事务里写入
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                rows = [row for row in batch if row is not None]
+                stop = len(rows) < len(batch)
+                if conn is None:
+                    self.failed += len(rows)
+                    continue
+                try:
+                    with conn:
+                        for row in rows:
+                            conn.execute(INSERT_SESSION, row)
+                            for key in (ALL, row["difficulty"]):
+                                row["totals_key"] = key
+                                conn.execute(UPSERT_TOTALS, row)
+                            conn.execute(UPSERT_DAILY, row)
+                except Exception:
+                    # 包括格式不对的记录（KeyError/TypeError等），整批回滚，写入线程继续运行
+                    self.failed += len(rows)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        if conn is not None:
+            conn.close()
+
+    def flush(self):
+        """等待已提交的记录全部写入（写入线程已经退出时不再等待）"""
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks and self._thread.is_alive():
+                done.wait(0.1)
+
+    def close(self):
+        """写完剩余记录后关闭"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+        self._reader.close()
+
+    def summary(self, days: int = 30) -> dict:
+        """
+        历史成绩汇总
+        返回 {"totals": {难度: {...}}, "curve": [(日期, 平均WPM), ...]}，
+        totals中键ALL为全部难度的汇总，curve为最近days个有练习的日期
+        """
+        totals = {}
+        for row in self._reader.execute(
+                "SELECT difficulty, sessions, total_time, total_chars, best_wpm, best_accuracy "
+                "FROM totals"):
+            totals[row[0]] = {
+                "sessions": row[1],
+                "total_time": row[2],
+                "total_chars": row[3],
+                "best_wpm": row[4],
+                "best_accuracy": row[5],
+            }
+        curve = self._reader.execute(
+            "SELECT date, wpm_sum / sessions FROM daily ORDER BY date DESC LIMIT ?",
+            (days,)).fetchall()
+        curve.reverse()
+        return {"totals": totals, "curve": curve}
+
+
+def open_history(path: str = HISTORY_PATH) -> Optional[HistoryStore]:
+    """打开历史成绩库，无法打开（例如目录不可写）时返回None，游戏照常进行"""
+    try:
+        return HistoryStore(path)
+    except (OSError, sqlite3.Error):
+        return None
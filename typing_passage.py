@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+打字练习游戏 - 长篇练习文本
+用mmap映射文本文件，按字符位置随机访问，任意大小的文件都不需要读入内存
+"""
+
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+# 控制字节显示为'?'；空白和非ASCII字节先保留，由下面的规则处理
+_CONTROL_TABLE = bytes(
+    b if b >= 32 and b != 127 or b in b"\t\n\v\f\r" else ord("?")
+    for b in range(256)
+)
+# 一个UTF-8字符（首字节加后续字节，或者孤立的后续字节）
+_UTF8_CHAR = re.compile(rb"[\xc0-\xff][\x80-\xbf]*|[\x80-\xbf]+")
+# 常见的非ASCII标点换成对应的ASCII字符，其他非ASCII字符显示为一个'?'
+_PUNCTUATION = {
+    "‘": b"'", "’": b"'", "“": b'"', "”": b'"',
+    "–": b"-", "—": b"-", "…": b"...", "\u00a0": b" ",
+}
+_SPACES = b" \t\n\v\f\r"
+_NBSP = b"\xc2\xa0"  # UTF-8的不间断空格
+# 开头的空白（包括normalize()换成空格的不间断空格）
+_LEADING_SPACE = re.compile(rb"(?:\s|\xc2\xa0)+")
+# 可以作为分块起点的字节：可打印的非空白ASCII（不会落在空白串或UTF-8字符的中间）
+_BLOCK_START = re.compile(rb"[!-~]")
+
+
+def _replace_utf8(match) -> bytes:
+    try:
+        return _PUNCTUATION.get(match.group().decode("utf-8"), b"?")
+    except UnicodeDecodeError:
+        return b"?"
+
+
+def normalize(data: bytes) -> str:
+    """
+    把文件中的字节变成可输入的文本：每个UTF-8字符显示为一个字符（常见标点换成ASCII，其他为'?'），
+    连续的空白（包括换行）合并为一个空格，控制字符显示为'?'
+    """
+    data = data.translate(_CONTROL_TABLE)
+    if not data.isascii():
+        data = _UTF8_CHAR.sub(_replace_utf8, data)
+    # split()/join()合并空白比正则替换快得多，开头和末尾的空白单独保留为一个空格
+    words = data.split()
+    if not words:
+        return " " if data else ""
+    text = b" ".join(words).decode("ascii")
+    if data[0] in _SPACES:
+        text = " " + text
+    if data[-1] in _SPACES:
+        text += " "
+    return text
+
+
+class PassageFile:
+    """
+    文件中的长篇练习文本（经normalize()规范化，每个字符都可以直接输入）
+    打开时扫描一遍全文，每隔约BLOCK字节记下一个分块起点（字节偏移和对应的字符位置）。
+    取第i个字符或一段文本时二分查找所在的分块，只规范化这一块（最近用过的几块会被缓存），
+    耗时与文件大小无关。支持len()、下标和切片，可以直接作为TypingSession的目标文本
+    """
+    BLOCK = 1 << 16      # 每块的大约字节数
+    BLOCK_CACHE = 4      # 缓存的已规范化分块数
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size == 0:
+                raise ValueError(f"练习文本文件为空: {path}")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        # 不要求输入文件开头和末尾的换行和空白（规范化后会变成空格的字符都算）
+        first = _LEADING_SPACE.match(self._map)
+        start = first.end() if first else 0
+        end = size
+        while end > start:
+            if self._map[end - 1] in _SPACES:
+                end -= 1
+            elif end - len(_NBSP) >= start and self._map[end - len(_NBSP):end] == _NBSP:
+                end -= len(_NBSP)
+            else:
+                break
+        if end == start:
+            self.close()
+            raise ValueError(f"练习文本文件中没有可输入的内容: {path}")
+
+        # 分块：每块从可打印的非空白ASCII字节开始，因此各块分别规范化的结果拼起来与整体规范化相同
+        self._byte_starts = array("q")
+        self._char_starts = array("q")
+        self._blocks = OrderedDict()  # 块号 -> 规范化后的文本
+        self._end = end
+        length = 0
+        while start < end:
+            match = _BLOCK_START.search(self._map, min(start + self.BLOCK, end), end)
+            stop = match.start() if match else end
+            self._byte_starts.append(start)
+            self._char_starts.append(length)
+            length += len(normalize(self._map[start:stop]))
+            start = stop
+        self._length = length
+
+    @property
+    def name(self) -> str:
+        """文件名（用于界面显示）"""
+        return os.path.basename(self.path)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _block(self, n: int) -> str:
+        """第n块规范化后的文本"""
+        text = self._blocks.get(n)
+        if text is not None:
+            self._blocks.move_to_end(n)
+            return text
+        stop = self._byte_starts[n + 1] if n + 1 < len(self._byte_starts) else self._end
+        text = self._blocks[n] = normalize(self._map[self._byte_starts[n]:stop])
+        if len(self._blocks) > self.BLOCK_CACHE:
+            self._blocks.popitem(last=False)
+        return text
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                return "".join(self[i] for i in range(start, stop, step))
+            parts = []
+            while start < stop:
+                n = bisect_right(self._char_starts, start) - 1
+                offset = self._char_starts[n]
+                text = self._block(n)
+                parts.append(text[start - offset:stop - offset])
+                start = offset + len(text)
+            return "".join(parts)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("练习文本下标越界")
+        n = bisect_right(self._char_starts, index) - 1
+        return self._block(n)[index - self._char_starts[n]]
+
+    def __repr__(self) -> str:
+        return f"PassageFile({self.path!r}, length={self._length})"
+
+    def close(self):
+        """释放文件映射"""
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+打字练习游戏 - 无界面回放引擎
+用带时间戳的按键流驱动与终端版、图形版相同的输入处理、计分和完成检测（TypingSession），
+不需要curses屏幕或SDL窗口，可用于回归测试和性能基准
+"""
+
+import random
+import sys
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from typing_core import TypingSession, is_typable
+
+# 按键流中表示退格的字符
+BACKSPACE = "\b"
+
+# 按键流：(单调时钟纳秒时间戳, 按键字符) 的序列
+Keystroke = Tuple[int, str]
+
+
+class ReplayStep:
+    """回放中一次按键之后的实时统计"""
+    __slots__ = ("t_ns", "key", "correct", "length", "accuracy", "wpm")
+
+    def __init__(self, t_ns, key, correct, length, accuracy, wpm):
+        self.t_ns = t_ns
+        self.key = key
+        self.correct = correct    # 输入是否正确（退格时为None）
+        self.length = length      # 当前输入长度
+        self.accuracy = accuracy
+        self.wpm = wpm
+
+    def __repr__(self):
+        return (f"ReplayStep(t_ns={self.t_ns}, key={self.key!r}, correct={self.correct}, "
+                f"length={self.length}, accuracy={self.accuracy:.1f}, wpm={self.wpm:.1f})")
+
+
+class ReplayResult:
+    """一局回放的最终统计"""
+
+    def __init__(self, session: TypingSession, steps: Optional[List[ReplayStep]]):
+        score = session.score
+        self.finished = session.finished
+        self.elapsed = session.elapsed(session.end_ns)
+        self.wpm = session.wpm(session.end_ns)
+        self.accuracy = score.accuracy()
+        self.errors = score.errors
+        self.typed = score.typed
+        self.backspaces = score.backspaces
+        self.max_combo = score.max_combo
+        self.length = len(session.buffer)
+        self.steps = steps
+
+    def __repr__(self):
+        return (f"ReplayResult(finished={self.finished}, elapsed={self.elapsed:.2f}, "
+                f"wpm={self.wpm:.1f}, accuracy={self.accuracy:.1f}, errors={self.errors})")
+
+
+def replay(target: str, keystrokes: Iterable[Keystroke],
+           record_steps: bool = False) -> ReplayResult:
+    """
+    回放一局练习
+    与游戏主循环一样忽略不可输入的按键，完成后忽略之后的按键。
+    record_steps为True时记录每次按键后的统计（会略微降低回放速度）
+    """
+    session = TypingSession(target)
+    score = session.score
+    steps = [] if record_steps else None
+    last_ns = 0
+
+    for t_ns, key in keystrokes:
+        if key == BACKSPACE:
+            if not session.backspace(t_ns):
+                continue
+            correct = None
+        elif len(key) == 1 and is_typable(key):
+            correct = session.type_char(key, t_ns)
+        else:
+            continue
+
+        last_ns = t_ns
+        if steps is not None:
+            steps.append(ReplayStep(t_ns, key, correct, session.position,
+                                    score.accuracy(), session.wpm(t_ns)))
+        if session.finished:
+            break
+
+    # 未完成的一局按最后一次按键的时间计算用时
+    if not session.finished:
+        session.end_ns = last_ns
+    return ReplayResult(session, steps)
+
+
+def synthesize_keystrokes(target: str, wpm: float = 60.0, error_rate: float = 0.03,
+                          seed: Optional[int] = None) -> List[Keystroke]:
+    """
+    生成模拟的按键流：按给定速度输入目标文本，
+    以error_rate的概率打错一个字符并立即退格改正
+    """
+    rng = random.Random(seed)
+    interval_ns = int(60e9 / (wpm * 5))
+    t_ns = 0
+    keystrokes = []
+    for char in target:
+        if rng.random() < error_rate:
+            keystrokes.append((t_ns, chr(rng.randint(97, 122))))
+            t_ns += interval_ns
+            keystrokes.append((t_ns, BACKSPACE))
+            t_ns += interval_ns
+        keystrokes.append((t_ns, char))
+        t_ns += int(interval_ns * rng.uniform(0.5, 1.5))
+    return keystrokes
+
+
+def main():
+    """回放一批模拟练习，报告回放速度"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    target = "Programs must be written for people to read, and only incidentally for machines to execute."
+    streams = [synthesize_keystrokes(target, seed=i) for i in range(count)]
+
+    start = time.perf_counter()
+    for stream in streams:
+        replay(target, stream)
+    elapsed = time.perf_counter() - start
+
+    print(f"回放 {count} 局（每局 {len(target)} 字符）用时 {elapsed:.3f} 秒，"
+          f"{count / elapsed:.0f} 局/秒")
+
+
+if __name__ == "__main__":
+    main()